@@ -0,0 +1,118 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+# ------------------------------------------------------------
+# CONFIGURATION
+# ------------------------------------------------------------
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE", "1") == "1"
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_TTL_S = float(os.getenv("ANSWER_CACHE_TTL_S", "3600"))
+ANSWER_CACHE_MAX_PER_DOC = int(os.getenv("ANSWER_CACHE_MAX_PER_DOC", "256"))
+ANSWER_CACHE_MAX_DOCS = int(os.getenv("ANSWER_CACHE_MAX_DOCS", "1000"))
+
+
+def _normalize(vec) -> np.ndarray:
+    vec = np.asarray(vec, dtype=np.float32).ravel()
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm > 0 else vec
+
+
+# ------------------------------------------------------------
+# SEMANTIC ANSWER CACHE
+# ------------------------------------------------------------
+class SemanticAnswerCache:
+    """
+    Per-document cache of generated answers keyed by query embedding.
+
+    A lookup hits when a stored query for the same doc_id has cosine
+    similarity at or above `threshold`. Entries expire after `ttl_s` and
+    are evicted LRU, both within a document and across documents.
+    """
+
+    def __init__(self, threshold: float = ANSWER_CACHE_THRESHOLD, ttl_s: float = ANSWER_CACHE_TTL_S,
+                 max_per_doc: int = ANSWER_CACHE_MAX_PER_DOC, max_docs: int = ANSWER_CACHE_MAX_DOCS,
+                 enabled: bool = ANSWER_CACHE_ENABLED):
+        self.enabled = enabled
+        self.threshold = threshold
+        self.ttl_s = ttl_s
+        self.max_per_doc = max_per_doc
+        self.max_docs = max_docs
+        self._docs = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0, "invalidations": 0}
+
+    def lookup(self, doc_id: str, query_emb) -> Optional[Dict[str, Any]]:
+        """Returns {"answer", "context", "similarity"} for a close enough earlier query, else None."""
+        if not self.enabled:
+            return None
+        vec = _normalize(query_emb)
+        now = time.time()
+        with self._lock:
+            entries = self._docs.get(doc_id)
+            if entries:
+                for key in [k for k, e in entries.items() if now - e["created"] > self.ttl_s]:
+                    del entries[key]
+                    self._stats["expired"] += 1
+            if not entries:
+                self._stats["misses"] += 1
+                return None
+
+            keys = list(entries)
+            sims = np.stack([entries[k]["embedding"] for k in keys]) @ vec
+            best = int(np.argmax(sims))
+            if sims[best] < self.threshold:
+                self._stats["misses"] += 1
+                return None
+
+            entries.move_to_end(keys[best])
+            self._docs.move_to_end(doc_id)
+            self._stats["hits"] += 1
+            entry = entries[keys[best]]
+            return {"answer": entry["answer"], "context": entry["context"], "similarity": float(sims[best])}
+
+    def store(self, doc_id: str, query: str, query_emb, answer: str, context: List[Dict[str, Any]]):
+        if not self.enabled:
+            return
+        with self._lock:
+            entries = self._docs.setdefault(doc_id, OrderedDict())
+            self._docs.move_to_end(doc_id)
+            entries[query] = {
+                "embedding": _normalize(query_emb),
+                "answer": answer,
+                "context": context,
+                "created": time.time(),
+            }
+            entries.move_to_end(query)
+            while len(entries) > self.max_per_doc:
+                entries.popitem(last=False)
+                self._stats["evictions"] += 1
+            while len(self._docs) > self.max_docs:
+                _, dropped = self._docs.popitem(last=False)
+                self._stats["evictions"] += len(dropped)
+
+    def invalidate(self, doc_id: str):
+        """
+        Drops every cached answer for a document, e.g. after re-ingestion,
+        including multi-document keys ("a,b") that cover it.
+        """
+        with self._lock:
+            for key in [k for k in self._docs if doc_id in k.split(",")]:
+                del self._docs[key]
+                self._stats["invalidations"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                "enabled": self.enabled,
+                "threshold": self.threshold,
+                "documents": len(self._docs),
+                "entries": sum(len(e) for e in self._docs.values()),
+                **self._stats,
+                "hit_rate": round(self._stats["hits"] / lookups, 3) if lookups else 0.0,
+            }
@@ -1,31 +1,51 @@
 import os
 import uuid
-from fastapi import FastAPI, UploadFile, File, HTTPException
+import json
+import asyncio
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request
+from fastapi.responses import PlainTextResponse, JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.routing import Mount
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
-from typing import List, Dict, Any, Union
+from typing import List, Dict, Any, Union, Optional
 from dotenv import load_dotenv
-import fitz  # PyMuPDF
-from PIL import Image
-from sentence_transformers import SentenceTransformer
-from qdrant_client import QdrantClient
-from qdrant_client.models import VectorParams, Distance, PointStruct
-import google.generativeai as genai
 import shutil
+import threading
 import time
-import pytesseract
+import queue
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 
-# ✅ Import new evaluation functions
-from metrics import evaluate_answer, log_metrics
+# Load .env before local modules read their configuration
+load_dotenv()
+
+# ✅ Answers are evaluated by a batched background worker
+from evaluator import BackgroundEvaluator
+from metrics_sink import latency_rollup
+from vector_store import create_vector_store, VECTOR_BACKEND
+from instrumentation import stage_timer, observe_stage, count, render_prometheus, maybe_profile, HTTP_SECONDS, PROFILE_REQUESTS
+from embedding import get_embedding_engine, engine_loaded, EMBED_MODEL_NAME
+from onnx_backend import model_variant
+from chunking import chunker_for_model
+from dedup import ChunkDeduper
+from generation import create_generator, gemini_model, PieceStream, GENERATOR_BACKEND
+from context_packer import pack_context, CONTEXT_CANDIDATES
+from executors import run_in, get_executor, executor_stats, Overloaded, ROUTE_LIMITERS
+from lexical_index import LexicalStore, is_lexical_query, reciprocal_rank_fusion
+import metrics
+from registry import DocumentRegistry
+from pages import submit_pages, iter_page_images, summarize_ocr, page_hashes, RENDER_DPI, OCR_POLICY, PAGE_WORKERS
+from artifact_cache import ArtifactCache, content_key
+from answer_cache import SemanticAnswerCache
+from jobs import JobQueue, QueueFull, owner_record, owner_alive
+from figures import FigureExtractor, RateLimiter, StubFigureModel, FIGURE_BACKEND
 
 # ------------------------------------------------------------
 # CONFIGURATION
 # ------------------------------------------------------------
-pytesseract.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
-load_dotenv()
-
 IMAGE_MODEL_NAME = "gemini-2.5-flash"
 TEXT_MODEL_NAME = "gemini-2.5-flash"
 
@@ -35,19 +55,44 @@ TEXT_API_KEY = os.getenv("GEMINI_API_NEW")
 QDRANT_URL = os.environ.get("QDRANT_URL")
 QDRANT_API_KEY = os.environ.get("QDRANT_API")
 
-TEMP_DIR = "extracted_images"
-DOC_STORE = {}
+# "per_document" (one collection per upload) or "shared" (one collection, filtered by doc_id)
+COLLECTION_MODE = os.getenv("COLLECTION_MODE", "per_document")
+SHARED_COLLECTION = os.getenv("SHARED_COLLECTION", "mrag_chunks")
 
-if not IMAGE_API_KEY or not TEXT_API_KEY:
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+UPSERT_BATCH_SIZE = int(os.getenv("UPSERT_BATCH_SIZE", "256"))
+# "hybrid" (BM25 + dense, fused by reciprocal rank) or "dense"
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+QUERY_BATCH_CONCURRENCY = int(os.getenv("QUERY_BATCH_CONCURRENCY", "8"))
+MODEL_WARMUP = os.getenv("MODEL_WARMUP", "1") == "1"
+
+# Uploads are copied to disk UPLOAD_CHUNK_KB at a time and capped at UPLOAD_MAX_MB
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_KB", "1024")) * 1024
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_MB", "200")) * 1024 * 1024
+# Ingestion moves through a document INGEST_SEGMENT_PAGES pages at a time, with at
+# most INGEST_QUEUE_DEPTH segments waiting between stages and INGEST_OCR_AHEAD in OCR
+INGEST_SEGMENT_PAGES = int(os.getenv("INGEST_SEGMENT_PAGES", "4"))
+INGEST_QUEUE_DEPTH = int(os.getenv("INGEST_QUEUE_DEPTH", "2"))
+INGEST_OCR_AHEAD = int(os.getenv("INGEST_OCR_AHEAD", "0")) or PAGE_WORKERS
+
+if (FIGURE_BACKEND == "gemini" and not IMAGE_API_KEY) or (GENERATOR_BACKEND == "gemini" and not TEXT_API_KEY):
     raise ValueError("Both GEMINI_API and GEMINI_API_NEW must be set.")
-if not QDRANT_URL or not QDRANT_API_KEY:
+if VECTOR_BACKEND == "qdrant" and (not QDRANT_URL or not QDRANT_API_KEY):
     raise ValueError("QDRANT_URL and QDRANT_API must be set.")
 
-# Local embedding model
-embed_model = SentenceTransformer("all-MiniLM-L6-v2")
+# Vector index: Qdrant service or in-process local index (VECTOR_BACKEND)
+vector_store = create_vector_store(VECTOR_BACKEND, url=QDRANT_URL, api_key=QDRANT_API_KEY)
+
+# Persistent document registry, rehydrated from disk at startup
+DOC_STORE = DocumentRegistry()
 
-# Configure Gemini
-genai.configure(api_key=TEXT_API_KEY)
+# Local embedding model (shared, micro-batched engine) loads lazily or in the warm-up below
+
+# Answer generator: Gemini, or a local stub for tests (GENERATOR_BACKEND)
+generator = create_generator(GENERATOR_BACKEND, api_key=TEXT_API_KEY, model_name=TEXT_MODEL_NAME)
+
+# One Gemini quota for the whole process, shared by concurrent ingest jobs
+figure_limiter = RateLimiter()
 
 # ------------------------------------------------------------
 # FASTAPI APP
@@ -62,15 +107,139 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    """Sheds load instead of queueing without bound when a route class is at its limit."""
+    return _overloaded_response(exc)
+
+
+def _overloaded_response(exc: Overloaded) -> JSONResponse:
+    count(f"shed_{exc.status}")
+    return JSONResponse({"detail": str(exc)}, status_code=exc.status,
+                        headers={"Retry-After": str(int(max(1, exc.retry_after_s)))})
+
+
+def hold_slot(limiter, body):
+    """
+    Keeps a route slot for the lifetime of a streamed response body. The
+    background task covers responses whose body never starts.
+    """
+    released = False
+
+    def release():
+        nonlocal released
+        if not released:
+            released = True
+            limiter.release()
+
+    async def wrapped():
+        try:
+            async for item in body:
+                yield item
+        finally:
+            release()
+
+    return wrapped(), BackgroundTask(release)
+
+
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    """
+    Rejects uploads whose declared size is over the cap, and sheds uploads
+    over the route limit, before the multipart body is read.
+    """
+    if request.url.path != "/upload_pdf":
+        return await call_next(request)
+    length = request.headers.get("content-length")
+    # Allow some room for the multipart framing around the file
+    if length and length.isdigit() and int(length) > UPLOAD_MAX_BYTES + 64 * 1024:
+        return JSONResponse({"detail": _upload_limit_message()}, status_code=413)
+    # Exception handlers sit inside the middleware stack, so answer Overloaded here
+    limiter = ROUTE_LIMITERS["upload"]
+    try:
+        await limiter.acquire()
+    except Overloaded as exc:
+        return _overloaded_response(exc)
+    try:
+        return await call_next(request)
+    finally:
+        limiter.release()
+
+
+@app.middleware("http")
+async def instrument_requests(request: Request, call_next):
+    """
+    Records per-route latency; optionally profiles sampled requests, or
+    `X-Profile: 1` ones when PROFILE_REQUESTS is set.
+    """
+    start = time.perf_counter()
+    status = 500
+    force = PROFILE_REQUESTS and request.headers.get("x-profile") == "1"
+    try:
+        with maybe_profile(request.url.path, force=force):
+            response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        HTTP_SECONDS.observe(time.perf_counter() - start, request.method, _route_label(request), str(status))
+
+
+def _route_label(request: Request) -> str:
+    """The route template, the mount prefix for static files, or "unmatched" — never the raw path."""
+    route = request.scope.get("route")
+    if route is not None:
+        return route.path
+    for mount in app.routes:
+        if isinstance(mount, Mount) and request.url.path.startswith(mount.path + "/"):
+            return mount.path
+    return "unmatched"
+
+
+# ------------------------------------------------------------
+# MODEL WARM-UP
+# ------------------------------------------------------------
+WARMUP_STATE = {}
+
+
+def _warm_up():
+    for name, loader in (("embedding", get_embedding_engine), ("evaluator", metrics.load_models)):
+        WARMUP_STATE[name] = "loading"
+        try:
+            loader()
+            WARMUP_STATE[name] = "ready"
+        except Exception as e:
+            WARMUP_STATE[name] = f"failed: {e}"
+
+
+@app.on_event("startup")
+async def start_warm_up():
+    if MODEL_WARMUP:
+        threading.Thread(target=_warm_up, name="model-warmup", daemon=True).start()
+
+
 os.makedirs("uploads", exist_ok=True)
+ingest_jobs = JobQueue()
+artifact_cache = ArtifactCache()
+lexical_store = LexicalStore()
+answer_cache = SemanticAnswerCache()
+evaluator = BackgroundEvaluator()
 app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
 
 # ------------------------------------------------------------
 # DATA MODELS
 # ------------------------------------------------------------
 class QueryRequest(BaseModel):
-    doc_id: str
+    doc_id: Optional[str] = None
     query: str
+    # Search several documents at once; ["*"] searches the whole corpus
+    doc_ids: Optional[List[str]] = None
+    # "hybrid", "dense" or "lexical"; unset picks lexical for exact-term queries
+    mode: Optional[str] = None
+
+
+class QueryBatchRequest(BaseModel):
+    queries: List[QueryRequest]
 
 
 class QueryResponse(BaseModel):
@@ -80,226 +249,910 @@ class QueryResponse(BaseModel):
 # ------------------------------------------------------------
 # UTILITY FUNCTIONS
 # ------------------------------------------------------------
-def extract_pdf_content(pdf_path: str):
-    """Extracts text and saves page images."""
-    if os.path.exists(TEMP_DIR):
-        shutil.rmtree(TEMP_DIR)
-    os.makedirs(TEMP_DIR)
-
-    doc = fitz.open(pdf_path)
-    texts, image_paths = [], []
-    for i, page in enumerate(doc):
-        texts.append(page.get_text())
-        pix = page.get_pixmap(dpi=150)
-        img_path = os.path.join(TEMP_DIR, f"page_{i}.png")
-        pix.save(img_path)
-        image_paths.append(img_path)
-    return texts, image_paths
-
-
-def ocr_images(image_paths: List[str]):
-    """Extract text from images using OCR."""
-    ocr_texts = []
-    for img_path in image_paths:
-        try:
-            img = Image.open(img_path)
-            text = pytesseract.image_to_string(img, lang="eng")
-            ocr_texts.append(text)
-        except Exception:
-            ocr_texts.append("")
-    return ocr_texts
-
-
-def chunk_text(texts: List[str], chunk_size: int = 500, chunk_overlap: int = 50):
-    """Splits text into overlapping chunks for embedding."""
-    output_list = []
-    for page_num, text in enumerate(texts):
-        words = text.split()
-        start, chunk_idx = 0, 1
-        while start < len(words):
-            chunk_words = words[start:start + chunk_size]
-            chunk_text = " ".join(chunk_words)
-            output_list.append({
-                "page": page_num,
-                "text": f"Page {page_num} chunk {chunk_idx}: {chunk_text}"
-            })
-            start += (chunk_size - chunk_overlap)
-            chunk_idx += 1
-    return output_list
+def chunk_text(texts: List[str], source: str = "text", first_page: int = 0):
+    """Splits page texts into token-bounded chunks sized to the embedding model (see chunking.py)."""
+    return chunker_for_model(get_embedding_engine().model).chunk_pages(texts, source=source, first_page=first_page)
+
+
+def figure_extractor() -> FigureExtractor:
+    """Uses PRO model to extract visual info (only once), under the process-wide Gemini quota."""
+    if FIGURE_BACKEND == "stub":
+        return FigureExtractor(StubFigureModel(), limiter=figure_limiter)
+    return FigureExtractor(gemini_model(IMAGE_API_KEY, IMAGE_MODEL_NAME), limiter=figure_limiter)
+
+
+def _batched(items, size: int):
+    """Yields lists of up to `size` items from any iterable."""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# Ends a page segment in a chunk stream: embed_and_store upserts what it holds
+SEGMENT_END = object()
+
 
+def _segment_batches(items, size: int):
+    """Like _batched, but also cuts at SEGMENT_END; yields (batch, segment_ended)."""
+    batch = []
+    for item in items:
+        if item is SEGMENT_END:
+            yield batch, True
+            batch = []
+            continue
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch, False
+            batch = []
+    if batch:
+        yield batch, True
 
-def automated_multimodal_extractor(image_paths: List[str]):
-    """Uses PRO model to extract visual info (only once)."""
-    genai.configure(api_key=IMAGE_API_KEY)
-    pro_model = genai.GenerativeModel(model_name=IMAGE_MODEL_NAME)
-    graph_data = {}
 
-    for i, img_path in enumerate(image_paths):
+_STAGE_DONE = object()
+
+
+def _prefetch(items, depth: int = INGEST_QUEUE_DEPTH):
+    """
+    Runs the `items` generator on its own thread, at most `depth` items ahead
+    of the consumer. Its errors re-raise in the consumer; when the consumer
+    stops early, the producer stops too.
+    """
+    q = queue.Queue(maxsize=max(1, depth))
+    stop = threading.Event()
+
+    def put(entry) -> bool:
+        while not stop.is_set():
+            try:
+                q.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
         try:
-            img = Image.open(img_path)
-            filter_prompt = "Does this image contain a chart or diagram? Reply YES or NO."
-            resp = pro_model.generate_content([filter_prompt, img]).text.strip().upper()
-            time.sleep(8)
-
-            if "YES" in resp:
-                desc_prompt = (
-                    f"Describe this figure from Page {i} in detail — steps, labels, and data."
-                )
-                data = pro_model.generate_content([desc_prompt, img]).text
-                graph_data[f"Page {i}"] = data
-                time.sleep(8)
-        except Exception:
-            time.sleep(5)
-
-    return graph_data
-
-
-def embed_and_store(output_list, collection: str):
-    """Embeds text chunks and stores in Qdrant."""
-    data = []
-    for idx, item in enumerate(output_list):
-        emb = embed_model.encode(item["text"])
-        data.append({"id": idx, "vector": emb.tolist(), "payload": item})
-
-    client = QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY, timeout=60.0)
-    if not client.collection_exists(collection):
-        client.create_collection(
-            collection_name=collection,
-            vectors_config=VectorParams(size=len(data[0]["vector"]), distance=Distance.COSINE)
-        )
-
-    points = [PointStruct(id=d["id"], vector=d["vector"], payload=d["payload"]) for d in data]
-    client.upsert(collection_name=collection, points=points, wait=True)
-    return client
+            for item in items:
+                if not put((item, None)):
+                    return
+            put((_STAGE_DONE, None))
+        except BaseException as e:
+            put((None, e))
+        finally:
+            items.close()
+
+    thread = threading.Thread(target=produce, name="ingest-stage", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = q.get()
+            if error is not None:
+                raise error
+            if item is _STAGE_DONE:
+                return
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+
+def _encode_cached(texts: List[str], batch_size: int) -> np.ndarray:
+    """
+    Encodes texts, reusing embeddings already in the artifact cache. Keys
+    include the runtime (PyTorch or ONNX fp32/int8) so their vectors never mix.
+    """
+    variant = model_variant(get_embedding_engine().model)
+    keys = [content_key(EMBED_MODEL_NAME, variant, t) for t in texts]
+    cached = artifact_cache.get_vectors("embedding", keys)
+    missing = [i for i, key in enumerate(keys) if key not in cached]
+    if missing:
+        fresh = get_embedding_engine().encode_batch([texts[i] for i in missing], batch_size)
+        new_vectors = {keys[i]: vec for i, vec in zip(missing, fresh)}
+        artifact_cache.put_vectors("embedding", new_vectors)
+        cached.update(new_vectors)
+    return np.stack([cached[key] for key in keys])
+
+
+def _point_id(doc_id: str, idx: int, collection: str):
+    """Per-document collections use plain indices; the shared collection needs ids unique across documents."""
+    if collection == SHARED_COLLECTION:
+        return str(uuid.uuid5(uuid.UUID(doc_id), str(idx)))
+    return idx
+
+
+def embed_and_store(output_list, collection: str, doc_id: str, batch_size: int = EMBED_BATCH_SIZE,
+                    upsert_batch_size: int = UPSERT_BATCH_SIZE, lexical=None, on_encode=None, on_upsert=None):
+    """
+    Embeds text chunks in batches and streams fixed-size upserts to the vector store.
+
+    At most one upsert is in flight while the next batch is encoding, so peak
+    memory is bounded by the batch sizes rather than the document size.
+    A SEGMENT_END in the stream flushes the chunks held so far, and
+    `on_encode(n, ms)` runs after each encoded batch and `on_upsert(payloads, ms)`
+    once each upsert has landed.
+    Chunks are also fed to the `lexical` index builder as they pass.
+    Returns a list of per-batch timings.
+    """
+    if not vector_store.collection_exists(collection):
+        vector_store.create_collection(collection, get_embedding_engine().model.get_sentence_embedding_dimension())
+        if collection == SHARED_COLLECTION:
+            vector_store.create_payload_index(collection, "doc_id")
+
+    def upsert(points):
+        ids, vectors, payloads = zip(*points)
+        with stage_timer("ingest", "upsert") as t:
+            vector_store.upsert(collection, list(ids), np.stack(vectors), list(payloads))
+        if on_upsert is not None:
+            on_upsert(payloads, t.ms)
+        return t.ms
+
+    timings, buffer, next_id = [], [], 0
+    pending = None
+    with ThreadPoolExecutor(max_workers=1) as uploader:
+        def flush(points):
+            nonlocal pending
+            if pending is not None:
+                timings[-1]["upsert_ms"] = round(pending.result(), 2)
+            timings.append({"batch": len(timings), "points": len(points)})
+            pending = uploader.submit(upsert, points)
+
+        for items, segment_ended in _segment_batches(output_list, batch_size):
+            if items:
+                with stage_timer("ingest", "encode") as t:
+                    vectors = _encode_cached([item["text"] for item in items], batch_size)
+                print(f"Encoded batch of {len(items)} chunks in {t.ms:.1f} ms")
+                if on_encode is not None:
+                    on_encode(len(items), t.ms)
+
+                for item, vec in zip(items, vectors):
+                    pid, payload = _point_id(doc_id, next_id, collection), {**item, "doc_id": doc_id}
+                    buffer.append((pid, vec, payload))
+                    if lexical is not None:
+                        lexical.add(pid, payload)
+                    next_id += 1
+            while len(buffer) >= upsert_batch_size:
+                flush(buffer[:upsert_batch_size])
+                buffer = buffer[upsert_batch_size:]
+            if segment_ended and buffer:
+                flush(buffer)
+                buffer = []
+
+        if pending is not None:
+            timings[-1]["upsert_ms"] = round(pending.result(), 2)
+
+    for t in timings:
+        print(f"Upserted batch {t['batch']}: {t['points']} points in {t['upsert_ms']} ms")
+    return timings
 
 # ------------------------------------------------------------
 # ROUTES
 # ------------------------------------------------------------
 @app.get("/health")
 async def health():
+    """Liveness: the process is up and serving requests."""
     return {"status": "ok", "backend": "running"}
 
 
-@app.post("/upload_pdf")
-async def upload_pdf(file: UploadFile = File(...)):
-    """Uploads PDF, extracts data, builds multimodal cache, embeds into Qdrant."""
-    try:
-        doc_id = str(uuid.uuid4())
-        filename = f"uploads/{doc_id}_{file.filename}"
+@app.get("/ready")
+async def ready():
+    """Readiness: heavy models are loaded and queries will not wait on them."""
+    components = {
+        "embedding": "ready" if engine_loaded() else WARMUP_STATE.get("embedding", "pending"),
+        "evaluator": "ready" if metrics.models_loaded() else WARMUP_STATE.get("evaluator", "pending"),
+    }
+    is_ready = components["embedding"] == "ready"
+    body = {"ready": is_ready, "documents": len(DOC_STORE), "components": components}
+    return JSONResponse(body, status_code=200 if is_ready else 503)
+
 
-        with open(filename, "wb") as f:
-            f.write(await file.read())
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
 
-        raw_texts, image_paths = extract_pdf_content(filename)
-        ocr_texts = ocr_images(image_paths)
-        graph_cache = automated_multimodal_extractor(image_paths)
 
-        output_list = []
-        for text in raw_texts + ocr_texts:
-            output_list.extend(chunk_text([text]))
+@app.get("/embedding_stats")
+async def embedding_stats():
+    if not engine_loaded():
+        return {"loaded": False}
+    # With a model server this is a socket round trip
+    return await run_in("io", get_embedding_engine().stats)
 
-        for page_key, desc in graph_cache.items():
-            output_list.append({
-                "page": int(page_key.split()[-1]),
-                "text": f"VISUAL CACHE: {desc}"
+
+def _ocr_segments(job, pdf_path: str, page_keys: List[str], segment_pages: int = INGEST_SEGMENT_PAGES,
+                  ahead: int = INGEST_OCR_AHEAD):
+    """
+    Yields {"pages", "cached"} for each segment of pages, in page order.
+    Pages come from the artifact cache or are OCR'd in the process pool, with
+    up to `ahead` segments submitted before the oldest one is collected.
+    """
+    pending = deque()
+
+    def collect(numbers, cached, futures):
+        with stage_timer("ingest", "ocr") as t:
+            fresh = {p["page"]: p for fut in futures for p in fut.result()}
+            artifact_cache.put_json("page", {page_keys[i]: p for i, p in fresh.items()})
+            pages = [dict(fresh[i]) if i in fresh else {**cached[page_keys[i]], "page": i} for i in numbers]
+        job.advance("ocr", len(pages), t.ms)
+        return {"pages": pages, "cached": len(numbers) - len(fresh)}
+
+    try:
+        for start in range(0, len(page_keys), segment_pages):
+            numbers = list(range(start, min(start + segment_pages, len(page_keys))))
+            cached = artifact_cache.get_json("page", [page_keys[i] for i in numbers])
+            missing = [i for i in numbers if page_keys[i] not in cached]
+            pending.append((numbers, cached, submit_pages(pdf_path, missing) if missing else []))
+            if len(pending) > ahead:
+                yield collect(*pending.popleft())
+        while pending:
+            yield collect(*pending.popleft())
+    finally:
+        for _, _, futures in pending:
+            for fut in futures:
+                fut.cancel()
+
+
+def _figure_segments(job, segments, pdf_path: str, hashes: List[str], extractor: FigureExtractor):
+    """Adds each segment's figure descriptions ({page: text}), from the artifact cache or Gemini."""
+    for seg in segments:
+        with stage_timer("ingest", "figures") as t:
+            numbers = [p["page"] for p in seg["pages"]]
+            keys = {i: content_key(hashes[i], IMAGE_MODEL_NAME) for i in numbers}
+            known = artifact_cache.get_json("figure", keys.values())
+            todo = [i for i in numbers if keys[i] not in known]
+
+            described = extractor.extract(iter_page_images(pdf_path, page_numbers=todo)) if todo else {}
+            artifact_cache.put_json("figure", {
+                keys[i]: described.get(f"Page {i}", "") for i in todo if i not in extractor.failed_pages
             })
+            figures = {i: described.get(f"Page {i}") or known.get(keys[i]) for i in numbers}
+            seg["figures"] = {i: desc for i, desc in figures.items() if desc}
+        job.advance("figures", len(numbers), t.ms)
+        yield seg
+
+
+def _segment_chunks(job, segments, totals: Dict[str, Any]):
+    """
+    Chunks and de-duplicates each segment's pages, appends its figure
+    descriptions and ends it with SEGMENT_END so it is upserted right away.
+    Running counts for the ingest summary are kept in `totals`.
+    """
+    dedup = ChunkDeduper()
+    for seg in segments:
+        pages = seg["pages"]
+        with stage_timer("ingest", "chunk") as t:
+            first = pages[0]["page"]
+            chunks = list(chunk_text([p["text"] for p in pages], source="text", first_page=first))
+            chunks.extend(chunk_text([p["ocr_text"] for p in pages], source="ocr", first_page=first))
+            chunks, duplicates = dedup(chunks)
+            for page, desc in seg["figures"].items():
+                chunks.append({"page": page, "source": "figure", "text": f"VISUAL CACHE: {desc}"})
+                totals["graph_cache"][f"Page {page}"] = desc
+        job.advance("chunk", len(pages), t.ms)
+
+        totals["pages"] += len(pages)
+        totals["cached_pages"] += seg["cached"]
+        totals["chunks"] += len(chunks)
+        totals["duplicate_chunks"] += duplicates
+        for mode, n in summarize_ocr(pages).items():
+            totals["ocr_pages"][mode] += n
+
+        yield from chunks
+        yield SEGMENT_END
+
 
-        collection_name = f"pdf_{doc_id}"
-        client = embed_and_store(output_list, collection_name)
+def _withdraw_document(doc_id: str, collection: str, stored_path: str):
+    """Removes a partly ingested document: registry row, vectors, lexical index and stored PDF."""
+    if doc_id in DOC_STORE:
+        del DOC_STORE[doc_id]
+    answer_cache.invalidate(doc_id)
+    lexical_store.delete(doc_id)
+    if collection == SHARED_COLLECTION:
+        vector_store.delete_document(collection, doc_id)
+    elif vector_store.collection_exists(collection):
+        vector_store.delete_collection(collection)
+    if os.path.exists(stored_path):
+        os.remove(stored_path)
 
+
+def withdraw_interrupted_ingests():
+    """
+    Withdraws documents left "indexing" by a process that is gone (e.g. a
+    restart mid-ingest): their job died with it, so they would never finish.
+    """
+    for doc_id, info in DOC_STORE.items():
+        if info.get("status") == "indexing" and not owner_alive(info.get("ingest_owner")):
+            print(f"Withdrawing interrupted ingest of {info['filename']} ({doc_id})")
+            _withdraw_document(doc_id, info["collection"], os.path.join("uploads", f"{doc_id}_{info['filename']}"))
+
+
+def ingest_document(job, pdf_path: str, doc_id: str, filename: str):
+    """
+    Runs one upload through a page-pipelined ingest: OCR → figures → chunk →
+    embed → upsert, a segment of pages at a time, with each stage on its own
+    thread and bounded queues between them. The document is registered as
+    "indexing" after its first upsert, so early pages answer queries while
+    later ones are still being processed.
+    """
+    started = time.perf_counter()
+    collection_name = SHARED_COLLECTION if COLLECTION_MODE == "shared" else f"pdf_{doc_id}"
+
+    with job.stage("prepare"):
+        hashes = page_hashes(pdf_path)
+        page_keys = [content_key(h, str(RENDER_DPI), OCR_POLICY) for h in hashes]
+        # The PDF is served from uploads/, so it must be there before the first page is searchable
+        stored_path = os.path.join("uploads", f"{doc_id}_{filename}")
+        shutil.move(pdf_path, stored_path)
+
+    totals = {"pages": 0, "chunks": 0, "duplicate_chunks": 0, "ocr_pages": summarize_ocr([]),
+              "cached_pages": 0, "graph_cache": {}}
+    indexed = {"pages": 0, "first_searchable_ms": None}
+
+    def on_upsert(payloads, ms):
+        pages = max(indexed["pages"], max(p["page"] for p in payloads) + 1)
+        job.advance("embed", pages - indexed["pages"], ms)
+        indexed["pages"] = pages
+        if indexed["first_searchable_ms"] is None:
+            indexed["first_searchable_ms"] = round((time.perf_counter() - started) * 1000, 2)
         DOC_STORE[doc_id] = {
-            "filename": file.filename,
-            "client": client,
+            "filename": filename,
             "collection": collection_name,
-            "graph_cache": graph_cache
+            "status": "indexing",
+            "pages_indexed": pages,
+            # Lets a restarted server tell an interrupted ingest from a running one
+            "ingest_owner": owner_record(),
         }
+        answer_cache.invalidate(doc_id)
+
+    extractor = figure_extractor()
+    lexical = lexical_store.builder(doc_id)
+    ocr = _prefetch(_ocr_segments(job, stored_path, page_keys))
+    figures = _prefetch(_figure_segments(job, ocr, stored_path, hashes, extractor))
+    chunks = _segment_chunks(job, figures, totals)
+    try:
+        with job.pipeline(("ocr", "figures", "chunk", "embed"), total=len(hashes)):
+            embed_timings = embed_and_store(chunks, collection_name, doc_id, lexical=lexical,
+                                            on_encode=lambda n, ms: job.advance("embed", 0, ms),
+                                            on_upsert=on_upsert)
+            job.advance("embed", len(hashes) - indexed["pages"])
+        with job.stage("finalize"):
+            lexical.finish()
+    except BaseException:
+        lexical.abort()
+        _withdraw_document(doc_id, collection_name, stored_path)
+        raise
+    finally:
+        for stage in (chunks, figures, ocr):
+            stage.close()
+
+    graph_cache = totals.pop("graph_cache")
+    print(f"OCR pages: {totals['ocr_pages']}, cached: {totals['cached_pages']}")
+    print(f"Removed {totals['duplicate_chunks']} near-duplicate chunks, {totals['chunks']} left")
+    print(f"Figure extraction: {extractor.stats}")
+    for key in ("calls", "retries", "prefiltered", "figures"):
+        count(f"figure_{key}", extractor.stats[key])
+    count("ingest_pages", totals["pages"])
+    count("ingest_pages_cached", totals["cached_pages"])
+    count("ingest_chunks", totals["chunks"])
+    count("ingest_chunks_deduplicated", totals["duplicate_chunks"])
+
+    answer_cache.invalidate(doc_id)
+    DOC_STORE[doc_id] = {
+        "filename": filename,
+        "collection": collection_name,
+        "status": "ready",
+        "graph_cache": graph_cache
+    }
+
+    return {
+        "doc_id": doc_id,
+        "filename": filename,
+        **totals,
+        "first_searchable_ms": indexed["first_searchable_ms"],
+        "embed_batches": embed_timings
+    }
+
+
+@app.on_event("startup")
+async def clean_up_interrupted_ingests():
+    await run_in("io", withdraw_interrupted_ingests)
+
+
+@app.get("/artifact_cache_stats")
+async def artifact_cache_stats():
+    return artifact_cache.stats()
+
+
+@app.get("/answer_cache_stats")
+async def answer_cache_stats():
+    return answer_cache.stats()
+
+
+@app.get("/evaluator_stats")
+async def evaluator_stats():
+    return evaluator.stats()
+
+
+@app.get("/metrics_rollup")
+async def metrics_rollup(window_s: float = 3600):
+    return await run_in("io", latency_rollup, window_s)
+
+
+@app.get("/executor_stats")
+async def executors_stats():
+    return {"executors": executor_stats(), "routes": {name: l.stats() for name, l in ROUTE_LIMITERS.items()}}
+
+
+def _upload_limit_message() -> str:
+    return f"PDF exceeds the {UPLOAD_MAX_BYTES // (1024 * 1024)} MB upload limit"
+
+
+async def _save_upload(file: UploadFile, path: str) -> int:
+    """Copies the upload to `path` UPLOAD_CHUNK_BYTES at a time; raises 413 past UPLOAD_MAX_BYTES."""
+    size = 0
+    out = await run_in("io", open, path, "wb")
+    try:
+        while True:
+            piece = await file.read(UPLOAD_CHUNK_BYTES)
+            if not piece:
+                return size
+            size += len(piece)
+            if size > UPLOAD_MAX_BYTES:
+                raise HTTPException(status_code=413, detail=_upload_limit_message())
+            await run_in("io", out.write, piece)
+    finally:
+        await run_in("io", out.close)
+
+
+@app.post("/upload_pdf")
+async def upload_pdf(file: UploadFile = File(...)):
+    """
+    Saves the upload to a job scratch dir and queues ingestion; returns a job
+    id right away. The upload route slot is held by limit_upload_size.
+    """
+    try:
+        job = ingest_jobs.create(filename=file.filename)
+    except QueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    try:
+        doc_id = str(uuid.uuid4())
+        filename = os.path.basename(file.filename or "upload.pdf")
+        pdf_path = os.path.join(job.scratch_dir, filename)
+        job.meta["doc_id"] = doc_id
+
+        size = await _save_upload(file, pdf_path)
+        print(f"Saved upload {filename}: {size} bytes")
+
+        ingest_jobs.start(job, ingest_document, pdf_path, doc_id, filename)
 
         return {
-            "status": "success",
-            "message": "PDF processed successfully.",
+            "status": "queued",
+            "message": "PDF accepted for processing.",
+            "job_id": job.id,
             "doc_id": doc_id,
-            "filename": file.filename
+            "filename": filename
         }
 
+    except HTTPException as e:
+        ingest_jobs.cancel(job, e.detail)
+        raise
     except Exception as e:
+        ingest_jobs.cancel(job, str(e))
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
 
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = ingest_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+
 @app.get("/docs_list")
 async def list_docs():
-    return [{"doc_id": doc_id, "filename": info["filename"]} for doc_id, info in DOC_STORE.items()]
+    return [{"doc_id": doc_id, "filename": info["filename"], "status": info.get("status", "ready")}
+            for doc_id, info in DOC_STORE.items()]
 
 
-@app.post("/query", response_model=QueryResponse)
-async def query_doc(req: QueryRequest):
-    """Retrieves context from Qdrant, generates answer, and logs accurate metrics."""
-    if req.doc_id not in DOC_STORE:
+def resolve_targets(req: QueryRequest) -> List[str]:
+    """Document ids a query should search; raises 404 for unknown ones."""
+    targets = req.doc_ids or ([req.doc_id] if req.doc_id else [])
+    if not targets:
+        raise HTTPException(status_code=400, detail="doc_id or doc_ids is required")
+    if "*" in targets:
+        return list(DOC_STORE)
+    missing = [d for d in targets if d not in DOC_STORE]
+    if missing:
         raise HTTPException(status_code=404, detail="Document not found")
+    return targets
 
-    try:
-        doc_info = DOC_STORE[req.doc_id]
-        client = doc_info["client"]
-        collection = doc_info["collection"]
-
-        start_total = time.time()
-        model = SentenceTransformer("all-MiniLM-L6-v2")
-        query_emb = model.encode(req.query)
-
-        # Retrieve top-5 chunks
-        start_retrieval = time.time()
-        hits = client.search(collection_name=collection, query_vector=query_emb.tolist(), limit=5)
-        retrieval_time = (time.time() - start_retrieval) * 1000
-
-        context, context_text, retrieved_ids = [], "", []
-        for h in hits:
-            pid = getattr(h, "id", len(retrieved_ids))
-            payload = h.payload
-            context.append({"id": pid, "page": payload.get("page"), "text": payload.get("text"), "score": h.score})
-            context_text += f"\n(Page {payload.get('page')}) {payload.get('text')}"
-            retrieved_ids.append(pid)
 
-        # Generate response
-        genai.configure(api_key=TEXT_API_KEY)
-        flash_model = genai.GenerativeModel(model_name=TEXT_MODEL_NAME)
+def shared_filter(doc_ids: List[str]) -> Optional[List[str]]:
+    """doc_id filter for the shared collection; None when the query covers every document in it."""
+    wanted = set(doc_ids)
+    if all(d in wanted for d, info in DOC_STORE.items() if info["collection"] == SHARED_COLLECTION):
+        return None
+    return doc_ids
+
+
+def search_documents(doc_ids: List[str], query_emb, limit: int = CONTEXT_CANDIDATES):
+    """
+    Searches one or more documents. Documents in the shared collection are
+    covered by a single doc_id-filtered search; documents with their own
+    collection are searched individually. Hits are merged by score.
+    """
+    by_collection = {}
+    for doc_id in doc_ids:
+        by_collection.setdefault(DOC_STORE[doc_id]["collection"], []).append(doc_id)
+
+    hits = []
+    for collection, ids in by_collection.items():
+        doc_filter = shared_filter(ids) if collection == SHARED_COLLECTION else None
+        hits.extend(vector_store.search(collection, query_emb, limit=limit, doc_ids=doc_filter))
+    if len(by_collection) > 1:
+        hits = sorted(hits, key=lambda h: h.score, reverse=True)[:limit]
+    return hits
+
+
+def build_context(hits):
+    """
+    Packs search hits into the prompt token budget (see context_packer.py) and
+    returns the response context, prompt context text and retrieved ids.
+    """
+    spans, stats = pack_context(hits)
+    context, context_text, retrieved_ids = [], "", []
+    for span in spans:
+        context.append({"id": span["ids"][0], "doc_id": span["doc_id"], "page": span["page"],
+                        "text": span["text"], "score": span["score"]})
+        context_text += f"\n(Page {span['page']}) {span['text']}"
+        retrieved_ids.extend(span["ids"])
+    count("context_tokens_saved", max(0, stats["saved_tokens"]))
+    count("context_tokens_added", max(0, -stats["saved_tokens"]))
+    print(f"Context packed: {stats['packed_tokens']} prompt tokens from {stats['candidates']} chunks "
+          f"({stats['saved_tokens']} saved, {stats['redundant']} redundant, {stats['over_budget']} over budget)")
+    return context, context_text, retrieved_ids
 
-        gemini_prompt = f"""
+
+def build_prompt(context_text: str, query: str) -> str:
+    return f"""
 You are a helpful assistant. Use ONLY the context to answer the query.
 
 Context:
 {context_text}
 
 Query:
-{req.query}
+{query}
 """
-        start_gen = time.time()
-        response = flash_model.generate_content(gemini_prompt)
-        generation_time = (time.time() - start_gen) * 1000
-        total_time = (time.time() - start_total) * 1000
-
-        # ✅ Accurate Evaluation using new metrics.py
-        ground_truth = 'The company\'s performance overview details robust revenue growth from 1996 to 1999, led by Licenses (18 SEK m to 83 SEK m), with strong growth also in Service contracts and Hardware. Product-wise, "FORMS" generated substantially higher license revenues than "INVOICES." The majority of license income comes from Europe (61%) and Sweden (23%). Strategically, the company covers an estimated 70% of the world market, with US sales organizations and plans to expand to Japan and another Asian market, using direct sales and distributors for local control. The Automatic Data Capture Market is described as young, growing, and largely untapped; its key customer benefits include reduced costs, increased accuracy, and shorter entry times'  # If testing, you can provide expected answer here
-        metrics = evaluate_answer(
-            query=req.query,
-            answer=response.text,
-            ground_truth=ground_truth,
-            retrieved_docs=[c["text"] for c in context],
-            relevant_ids=[],  # If known
-            retrieved_ids=retrieved_ids
-        )
-
-        # Add timing to logs
-        metrics["Retrieval(ms)"] = round(retrieval_time, 2)
-        metrics["Generation(ms)"] = round(generation_time, 2)
-        metrics["Total(ms)"] = round(total_time, 2)
-
-        log_metrics(req.query, response.text, metrics)
-
-        print("\n===== QUERY EVALUATION METRICS =====")
-        for k, v in metrics.items():
-            print(f"{k}: {v}")
-        print("=====================================\n")
-
-        return {"answer": response.text, "context": context}
+
+
+def generate_answer(prompt: str) -> str:
+    return generator.generate(prompt)
+
+
+def submit_evaluation(query: str, answer: str, context, retrieved_ids, timings: Dict[str, float]):
+    # ✅ Accurate Evaluation using new metrics.py, scored in the background
+    ground_truth = 'The company\'s performance overview details robust revenue growth from 1996 to 1999, led by Licenses (18 SEK m to 83 SEK m), with strong growth also in Service contracts and Hardware. Product-wise, "FORMS" generated substantially higher license revenues than "INVOICES." The majority of license income comes from Europe (61%) and Sweden (23%). Strategically, the company covers an estimated 70% of the world market, with US sales organizations and plans to expand to Japan and another Asian market, using direct sales and distributors for local control. The Automatic Data Capture Market is described as young, growing, and largely untapped; its key customer benefits include reduced costs, increased accuracy, and shorter entry times'  # If testing, you can provide expected answer here
+    evaluator.submit(
+        {
+            "query": query,
+            "answer": answer,
+            "ground_truth": ground_truth,
+            "retrieved_docs": [c["text"] for c in context],
+            "relevant_ids": [],  # If known
+            "retrieved_ids": retrieved_ids,
+        },
+        {k: round(v, 2) for k, v in timings.items()},
+    )
+
+
+def retrieval_mode(req: QueryRequest) -> str:
+    if req.mode:
+        return req.mode
+    if RETRIEVAL_MODE == "hybrid" and is_lexical_query(req.query):
+        return "lexical"
+    return RETRIEVAL_MODE
+
+
+async def retrieve(doc_ids: List[str], query: str, query_emb, mode: str = RETRIEVAL_MODE):
+    """Dense search, or dense and BM25 in parallel merged by reciprocal-rank fusion."""
+    if mode == "dense":
+        return await run_in("search", search_documents, doc_ids, query_emb)
+    dense, lexical = await asyncio.gather(
+        run_in("search", search_documents, doc_ids, query_emb),
+        run_in("search", lexical_store.search, doc_ids, query, CONTEXT_CANDIDATES),
+    )
+    return reciprocal_rank_fusion([dense, lexical], CONTEXT_CANDIDATES)
+
+
+async def embed_and_retrieve(req: QueryRequest, doc_ids: List[str], pipeline: str):
+    """
+    Returns (query_emb, cached_answer, hits, retrieval_ms). Lexical-only
+    queries that match skip the encode and the answer cache (query_emb is
+    None); those with no lexical match fall back to hybrid retrieval.
+    """
+    mode = retrieval_mode(req)
+    if mode == "lexical":
+        with stage_timer(pipeline, "retrieval") as t:
+            hits = await run_in("search", lexical_store.search, doc_ids, req.query, CONTEXT_CANDIDATES)
+        if hits:
+            count("lexical_only_query")
+            return None, None, hits, t.ms
+        mode = "hybrid"
+
+    with stage_timer(pipeline, "embed"):
+        engine = await run_in("embed", get_embedding_engine)
+        query_emb = await engine.aencode(req.query)
+
+    with stage_timer(pipeline, "answer_cache"):
+        cached = answer_cache.lookup(",".join(sorted(doc_ids)), query_emb)
+    if cached is not None:
+        count("answer_cache_hit")
+        return query_emb, cached, None, 0.0
+    count("answer_cache_miss")
+
+    # Retrieve candidate chunks; build_context packs them into the token budget
+    with stage_timer(pipeline, "retrieval") as t:
+        hits = await retrieve(doc_ids, req.query, query_emb, mode)
+    return query_emb, None, hits, t.ms
+
+
+@app.post("/query", response_model=QueryResponse)
+async def query_doc(req: QueryRequest):
+    """Retrieves context from the vector store, generates answer, and logs accurate metrics."""
+    async with ROUTE_LIMITERS["query"].slot():
+        return await _answer_query(req)
+
+
+async def _answer_query(req: QueryRequest):
+    doc_ids = resolve_targets(req)
+    cache_key = ",".join(sorted(doc_ids))
+
+    try:
+        start_total = time.perf_counter()
+        query_emb, cached, hits, retrieval_time = await embed_and_retrieve(req, doc_ids, "query")
+        if cached is not None:
+            print(f"Answer cache hit (similarity {cached['similarity']:.3f}) in {(time.perf_counter() - start_total) * 1000:.2f} ms")
+            return {"answer": cached["answer"], "context": cached["context"]}
+        context, context_text, retrieved_ids = build_context(hits)
+
+        # Generate response
+        with stage_timer("query", "generation") as t:
+            answer = await run_in("generate", generate_answer, build_prompt(context_text, req.query))
+        generation_time = t.ms
+        total_time = (time.perf_counter() - start_total) * 1000
+        observe_stage("query", "total", total_time / 1000)
+        if query_emb is not None:
+            answer_cache.store(cache_key, req.query, query_emb, answer, context)
+
+        submit_evaluation(req.query, answer, context, retrieved_ids, {
+            "Retrieval(ms)": retrieval_time,
+            "Generation(ms)": generation_time,
+            "Total(ms)": total_time,
+        })
+
+        return {"answer": answer, "context": context}
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Query failed: {str(e)}")
+
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+_STREAM_DONE = object()
+
+
+@app.post("/query_stream")
+async def query_stream(req: QueryRequest, request: Request):
+    """
+    Server-Sent Events version of /query: a `context` event with the
+    retrieved chunks, then `token` events as the model generates, then
+    `done` with the full answer (or `error`). Generation stops as soon as
+    the client disconnects.
+    """
+    doc_ids = resolve_targets(req)
+    cache_key = ",".join(sorted(doc_ids))
+
+    async def events():
+        start_total = time.perf_counter()
+        try:
+            query_emb, cached, hits, retrieval_time = await embed_and_retrieve(req, doc_ids, "query_stream")
+            if cached is not None:
+                yield _sse("context", cached["context"])
+                yield _sse("token", {"text": cached["answer"]})
+                yield _sse("done", {"answer": cached["answer"], "cached": True})
+                return
+
+            context, context_text, retrieved_ids = build_context(hits)
+            yield _sse("context", context)
+
+            pieces = PieceStream(generator.stream(build_prompt(context_text, req.query)))
+            answer, first_token_ms = [], None
+            start_gen = time.perf_counter()
+            try:
+                while True:
+                    piece = await run_in("generate", pieces.next, _STREAM_DONE)
+                    if piece is _STREAM_DONE:
+                        break
+                    if await request.is_disconnected():
+                        count("query_stream_disconnect")
+                        return
+                    if first_token_ms is None:
+                        first_token_ms = (time.perf_counter() - start_total) * 1000
+                        observe_stage("query_stream", "first_token", first_token_ms / 1000)
+                    answer.append(piece)
+                    yield _sse("token", {"text": piece})
+            finally:
+                # On cancellation a next() may still be running on the executor;
+                # close there, once it returns, without blocking the event loop
+                get_executor("generate").submit(pieces.close)
+            generation_time = (time.perf_counter() - start_gen) * 1000
+
+            answer = "".join(answer)
+            total_time = (time.perf_counter() - start_total) * 1000
+            observe_stage("query_stream", "total", total_time / 1000)
+            yield _sse("done", {"answer": answer, "cached": False, "first_token_ms": round(first_token_ms or total_time, 2)})
+
+            if query_emb is not None:
+                answer_cache.store(cache_key, req.query, query_emb, answer, context)
+            submit_evaluation(req.query, answer, context, retrieved_ids, {
+                "Retrieval(ms)": retrieval_time,
+                "Generation(ms)": generation_time,
+                "Total(ms)": total_time,
+            })
+        except Exception as e:
+            yield _sse("error", {"detail": f"Query failed: {str(e)}"})
+
+    limiter = ROUTE_LIMITERS["query"]
+    await limiter.acquire()
+    body, release = hold_slot(limiter, events())
+    return StreamingResponse(body, media_type="text/event-stream", background=release,
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+def search_many(targets: List[List[str]], query_embs: np.ndarray, limit: int = CONTEXT_CANDIDATES):
+    """
+    Batched retrieval for many queries. Queries whose documents live in a
+    single collection are grouped into one search_batch call per collection;
+    queries spanning several collections fall back to search_documents.
+    """
+    results = [None] * len(targets)
+    groups = {}
+    for i, doc_ids in enumerate(targets):
+        collections = {DOC_STORE[d]["collection"] for d in doc_ids}
+        if len(collections) == 1:
+            groups.setdefault(collections.pop(), []).append(i)
+        else:
+            results[i] = search_documents(doc_ids, query_embs[i], limit)
+
+    for collection, idxs in groups.items():
+        filters = [shared_filter(targets[i]) if collection == SHARED_COLLECTION else None for i in idxs]
+        batch_hits = vector_store.search_batch(collection, query_embs[idxs], limit=limit, doc_ids=filters)
+        for i, hits in zip(idxs, batch_hits):
+            results[i] = hits
+    return results
+
+
+@app.post("/query_batch")
+async def query_batch(req: QueryBatchRequest):
+    """
+    Answers many (doc_id, query) pairs: one batched encode, one batched search
+    per collection, then generations with bounded concurrency. Results stream
+    back as NDJSON lines, in completion order, as each answer finishes.
+    """
+    if not req.queries:
+        raise HTTPException(status_code=400, detail="queries must not be empty")
+    targets = [resolve_targets(q) for q in req.queries]
+
+    limiter = ROUTE_LIMITERS["batch"]
+    await limiter.acquire()
+    try:
+        results = await _batch_results(req, targets)
+    except BaseException:
+        limiter.release()
+        raise
+    body, release = hold_slot(limiter, results)
+    return StreamingResponse(body, media_type="application/x-ndjson", background=release)
+
+
+async def _batch_results(req: QueryBatchRequest, targets: List[List[str]]):
+    """
+    Encodes and searches the whole batch, then returns an async generator of
+    NDJSON result lines. Each query is routed like /query (retrieval_mode):
+    lexical-only queries that match skip the encode and the answer cache.
+    """
+    cache_keys = [",".join(sorted(t)) for t in targets]
+    modes = [retrieval_mode(q) for q in req.queries]
+    n_queries = len(req.queries)
+
+    start_total = time.perf_counter()
+    hits = [None] * n_queries
+    retrieval_time = 0.0
+    lexical_first = [i for i, mode in enumerate(modes) if mode == "lexical"]
+    if lexical_first:
+        with stage_timer("query_batch", "retrieval") as t:
+            found = await asyncio.gather(*[
+                run_in("search", lexical_store.search, targets[i], req.queries[i].query, CONTEXT_CANDIDATES)
+                for i in lexical_first
+            ])
+        retrieval_time += t.ms
+        for i, h in zip(lexical_first, found):
+            if h:
+                hits[i] = h
+            else:
+                modes[i] = "hybrid"
+        count("lexical_only_query", sum(1 for h in found if h))
+
+    # Everything not answered lexically needs an embedding
+    dense = [i for i in range(n_queries) if hits[i] is None]
+    query_embs = [None] * n_queries
+    cached = [None] * n_queries
+    if dense:
+        with stage_timer("query_batch", "embed"):
+            engine = await run_in("embed", get_embedding_engine)
+            embs = await run_in("embed", engine.encode_batch, [req.queries[i].query for i in dense])
+        for i, emb in zip(dense, embs):
+            query_embs[i] = emb
+            cached[i] = answer_cache.lookup(cache_keys[i], emb)
+    todo = [i for i in dense if cached[i] is None]
+    count("answer_cache_hit", len(dense) - len(todo))
+    count("answer_cache_miss", len(todo))
+
+    if todo:
+        hybrid = [i for i in todo if modes[i] == "hybrid"]
+        with stage_timer("query_batch", "retrieval") as t:
+            searches = [run_in("search", search_many, [targets[i] for i in todo], np.stack([query_embs[i] for i in todo]))]
+            searches += [run_in("search", lexical_store.search, targets[i], req.queries[i].query, CONTEXT_CANDIDATES)
+                         for i in hybrid]
+            found, *lexical = await asyncio.gather(*searches)
+        retrieval_time += t.ms
+        lexical_hits = dict(zip(hybrid, lexical))
+        for i, h in zip(todo, found):
+            hits[i] = reciprocal_rank_fusion([h, lexical_hits[i]], CONTEXT_CANDIDATES) if i in lexical_hits else h
+    retrieved = max(1, len(todo) + n_queries - len(dense))
+
+    limit = asyncio.Semaphore(QUERY_BATCH_CONCURRENCY)
+
+    async def answer_one(i: int):
+        # Any failure becomes this item's error line; the rest of the batch still streams
+        try:
+            return await answer_item(i)
+        except Exception as e:
+            return {"index": i, "doc_ids": targets[i], "query": req.queries[i].query, "error": str(e)}
+
+    async def answer_item(i: int):
+        q = req.queries[i]
+        base = {"index": i, "doc_ids": targets[i], "query": q.query}
+        if cached[i] is not None:
+            return {**base, "answer": cached[i]["answer"], "context": cached[i]["context"], "cached": True}
+        context, context_text, retrieved_ids = build_context(hits[i])
+        async with limit:
+            with stage_timer("query_batch", "generation") as t:
+                answer = await run_in("generate", generate_answer, build_prompt(context_text, q.query))
+        if query_embs[i] is not None:
+            answer_cache.store(cache_keys[i], q.query, query_embs[i], answer, context)
+        submit_evaluation(q.query, answer, context, retrieved_ids, {
+            "Retrieval(ms)": retrieval_time / retrieved,
+            "Generation(ms)": t.ms,
+            "Total(ms)": (time.perf_counter() - start_total) * 1000,
+        })
+        return {**base, "answer": answer, "context": context, "cached": False}
+
+    async def stream():
+        tasks = [asyncio.ensure_future(answer_one(i)) for i in range(n_queries)]
+        try:
+            for fut in asyncio.as_completed(tasks):
+                yield json.dumps(await fut, default=str) + "\n"
+        finally:
+            # The client went away (or the stream failed): stop the answers still pending
+            for task in tasks:
+                task.cancel()
+
+    return stream()
+
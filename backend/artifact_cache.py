@@ -0,0 +1,145 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable
+
+import numpy as np
+
+# ------------------------------------------------------------
+# CONFIGURATION
+# ------------------------------------------------------------
+ARTIFACT_CACHE_ENABLED = os.getenv("ARTIFACT_CACHE", "1") == "1"
+ARTIFACT_CACHE_PATH = os.getenv("ARTIFACT_CACHE_PATH", "artifact_cache.sqlite3")
+ARTIFACT_CACHE_MAX_MB = float(os.getenv("ARTIFACT_CACHE_MAX_MB", "2048"))
+
+
+def content_key(*parts: str) -> str:
+    """Stable sha256 key over the given parts."""
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+# ------------------------------------------------------------
+# ARTIFACT CACHE
+# ------------------------------------------------------------
+class ArtifactCache:
+    """
+    On-disk, content-addressed cache for ingestion artifacts.
+
+    Entries are grouped by kind ("page", "figure", "embedding") and keyed by
+    content hash, so a re-uploaded or partly changed document reuses every
+    page it has seen before. Total size is capped with LRU eviction.
+    """
+
+    def __init__(self, path: str = ARTIFACT_CACHE_PATH, max_mb: float = ARTIFACT_CACHE_MAX_MB,
+                 enabled: bool = ARTIFACT_CACHE_ENABLED):
+        self.enabled = enabled
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._size = 0
+        if not enabled:
+            return
+
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS artifacts ("
+            " kind TEXT NOT NULL, key TEXT NOT NULL, value BLOB NOT NULL,"
+            " size INTEGER NOT NULL, last_access REAL NOT NULL,"
+            " PRIMARY KEY (kind, key))"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS artifacts_lru ON artifacts (last_access)")
+        self._db.commit()
+        self._size = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM artifacts").fetchone()[0]
+
+    # -- raw access --------------------------------------------------
+    def _count(self, kind: str, hits: int, misses: int):
+        s = self._stats.setdefault(kind, {"hits": 0, "misses": 0})
+        s["hits"] += hits
+        s["misses"] += misses
+
+    def get_many_raw(self, kind: str, keys: Iterable[str]) -> Dict[str, bytes]:
+        keys = list(dict.fromkeys(keys))
+        if not self.enabled or not keys:
+            return {}
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                part = keys[start:start + 500]
+                marks = ",".join("?" * len(part))
+                rows = self._db.execute(
+                    f"SELECT key, value FROM artifacts WHERE kind = ? AND key IN ({marks})",
+                    [kind, *part],
+                ).fetchall()
+                found.update(rows)
+            if found:
+                now = time.time()
+                self._db.executemany(
+                    "UPDATE artifacts SET last_access = ? WHERE kind = ? AND key = ?",
+                    [(now, kind, k) for k in found],
+                )
+                self._db.commit()
+            self._count(kind, len(found), len(keys) - len(found))
+        return found
+
+    def put_many_raw(self, kind: str, items: Dict[str, bytes]):
+        if not self.enabled or not items:
+            return
+        now = time.time()
+        with self._lock:
+            for key, value in items.items():
+                old = self._db.execute(
+                    "SELECT size FROM artifacts WHERE kind = ? AND key = ?", (kind, key)
+                ).fetchone()
+                self._size += len(value) - (old[0] if old else 0)
+                self._db.execute(
+                    "INSERT OR REPLACE INTO artifacts (kind, key, value, size, last_access) VALUES (?, ?, ?, ?, ?)",
+                    (kind, key, value, len(value), now),
+                )
+            self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        # Drop least recently used entries until 90% of the limit
+        if self._size <= self.max_bytes:
+            return
+        target = int(self.max_bytes * 0.9)
+        rows = self._db.execute("SELECT kind, key, size FROM artifacts ORDER BY last_access").fetchall()
+        evicted = []
+        for kind, key, size in rows:
+            if self._size <= target:
+                break
+            evicted.append((kind, key))
+            self._size -= size
+        self._db.executemany("DELETE FROM artifacts WHERE kind = ? AND key = ?", evicted)
+        self._stats.setdefault("evicted", 0)
+        self._stats["evicted"] += len(evicted)
+
+    # -- typed helpers -----------------------------------------------
+    def get_json(self, kind: str, keys: Iterable[str]) -> Dict[str, Any]:
+        return {k: json.loads(v) for k, v in self.get_many_raw(kind, keys).items()}
+
+    def put_json(self, kind: str, items: Dict[str, Any]):
+        self.put_many_raw(kind, {k: json.dumps(v).encode("utf-8") for k, v in items.items()})
+
+    def get_vectors(self, kind: str, keys: Iterable[str]) -> Dict[str, np.ndarray]:
+        return {k: np.frombuffer(v, dtype=np.float32) for k, v in self.get_many_raw(kind, keys).items()}
+
+    def put_vectors(self, kind: str, items: Dict[str, np.ndarray]):
+        self.put_many_raw(kind, {k: np.asarray(v, dtype=np.float32).tobytes() for k, v in items.items()})
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "size_mb": round(self._size / (1024 * 1024), 2),
+                "max_mb": round(self.max_bytes / (1024 * 1024), 2),
+                **{k: (dict(v) if isinstance(v, dict) else v) for k, v in self._stats.items()},
+            }
@@ -0,0 +1,132 @@
+import os
+import re
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+import numpy as np
+
+# ------------------------------------------------------------
+# CONFIGURATION
+# ------------------------------------------------------------
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "0"))  # 0 = the embedding model's limit
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "32"))
+CHUNK_MIN_FILL = float(os.getenv("CHUNK_MIN_FILL", "0.5"))
+CHUNK_TOKENIZE_BATCH = int(os.getenv("CHUNK_TOKENIZE_BATCH", "32"))
+
+# A sentence ends at ., ! or ? followed by whitespace, or at a line break;
+# a blank line ends a paragraph.
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\n+")
+_PARAGRAPH_END = re.compile(r"\n\s*\n")
+_WORD = re.compile(r"\w+|[^\w\s]")
+
+
+def sentence_spans(text: str) -> List[Tuple[int, int, bool]]:
+    """(start, end, ends_paragraph) character spans for each sentence, whitespace trimmed."""
+    spans, start = [], 0
+    for m in _SENTENCE_END.finditer(text):
+        if m.start() > start:
+            spans.append((start, m.start(), bool(_PARAGRAPH_END.search(m.group()))))
+        start = m.end()
+    if start < len(text) and text[start:].strip():
+        spans.append((start, len(text.rstrip()), True))
+    return spans
+
+
+# ------------------------------------------------------------
+# TOKEN CHUNKER
+# ------------------------------------------------------------
+class TokenChunker:
+    """
+    Splits page texts into windows that fit the embedding model's input.
+
+    Windows are measured in model tokens (from the tokenizer's offset
+    mapping, tokenized in batches across pages) and are built from whole
+    sentences; a window closes early at a paragraph break once it is at
+    least `min_fill` full. Sentences longer than a window are cut at token
+    boundaries. Chunks carry character offsets into their page text.
+    """
+
+    def __init__(self, tokenizer, max_tokens: int, overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+                 min_fill: float = CHUNK_MIN_FILL, batch_size: int = CHUNK_TOKENIZE_BATCH):
+        self.tokenizer = tokenizer
+        self.max_tokens = max(8, int(max_tokens))
+        self.overlap_tokens = max(0, min(int(overlap_tokens), self.max_tokens // 2))
+        self.min_fill = min_fill
+        self.batch_size = max(1, batch_size)
+
+    def token_starts(self, texts: List[str]) -> List[np.ndarray]:
+        """Character start offset of every token, per text, in one tokenizer call."""
+        if hasattr(self.tokenizer, "token_starts"):
+            return self.tokenizer.token_starts(texts)
+        if self.tokenizer is not None and getattr(self.tokenizer, "is_fast", False):
+            enc = self.tokenizer(texts, add_special_tokens=False, return_offsets_mapping=True,
+                                 return_attention_mask=False, return_token_type_ids=False)
+            return [np.fromiter((s for s, _ in offsets), dtype=np.int64, count=len(offsets))
+                    for offsets in enc["offset_mapping"]]
+        # Slow tokenizers have no offsets; approximate word-pieces with words and punctuation.
+        return [np.fromiter((m.start() for m in _WORD.finditer(t)), dtype=np.int64) for t in texts]
+
+    def _windows(self, text: str, starts: np.ndarray) -> Iterator[Tuple[int, int, int]]:
+        """Yields (char_start, char_end, n_tokens) windows for one text."""
+        units = []  # (char_start, char_end, tokens, ends_paragraph)
+        for s, e, para in sentence_spans(text):
+            lo, hi = np.searchsorted(starts, [s, e])
+            n = int(hi - lo)
+            if n <= self.max_tokens:
+                units.append((s, e, n, para))
+                continue
+            # Oversized sentence: cut it at token boundaries
+            for i in range(lo, hi, self.max_tokens):
+                j = min(i + self.max_tokens, hi)
+                cut_end = int(starts[j]) if j < hi else e
+                units.append((int(starts[i]) if i > lo else s, cut_end, j - i, para and j == hi))
+
+        window, tokens = [], 0
+        for unit in units:
+            if window and tokens + unit[2] > self.max_tokens:
+                yield window[0][0], window[-1][1], tokens
+                # Carry trailing sentences forward as overlap
+                carry, carried = [], 0
+                for prev in reversed(window):
+                    if carried + prev[2] > self.overlap_tokens or carried + prev[2] + unit[2] > self.max_tokens:
+                        break
+                    carry.insert(0, prev)
+                    carried += prev[2]
+                window, tokens = carry, carried
+            window.append(unit)
+            tokens += unit[2]
+            if unit[3] and tokens >= self.min_fill * self.max_tokens:
+                yield window[0][0], window[-1][1], tokens
+                window, tokens = [], 0
+        if window:
+            yield window[0][0], window[-1][1], tokens
+
+    def chunk_pages(self, texts: Iterable[str], source: str = "text",
+                    first_page: int = 0) -> Iterator[Dict]:
+        """Streams chunk dicts {page, source, start, end, tokens, text} over all pages."""
+        page = first_page
+        batch = []
+        for text in texts:
+            batch.append(text or "")
+            if len(batch) >= self.batch_size:
+                yield from self._chunk_batch(batch, source, page)
+                page += len(batch)
+                batch = []
+        if batch:
+            yield from self._chunk_batch(batch, source, page)
+
+    def _chunk_batch(self, texts: List[str], source: str, first_page: int) -> Iterator[Dict]:
+        non_empty = [i for i, t in enumerate(texts) if t.strip()]
+        all_starts = self.token_starts([texts[i] for i in non_empty]) if non_empty else []
+        for i, starts in zip(non_empty, all_starts):
+            text = texts[i]
+            for s, e, n in self._windows(text, starts):
+                yield {"page": first_page + i, "source": source, "start": s, "end": e,
+                       "tokens": n, "text": text[s:e]}
+
+
+def chunker_for_model(model, max_tokens: int = CHUNK_MAX_TOKENS,
+                      overlap_tokens: int = CHUNK_OVERLAP_TOKENS) -> TokenChunker:
+    """Builds a chunker sized to a SentenceTransformer's max_seq_length (minus [CLS]/[SEP])."""
+    tokenizer = getattr(model, "tokenizer", None)
+    limit = (getattr(model, "max_seq_length", None) or 256) - 2
+    return TokenChunker(tokenizer, min(max_tokens, limit) if max_tokens > 0 else limit, overlap_tokens)
@@ -0,0 +1,94 @@
+import os
+from typing import Any, Dict, List, Tuple
+
+from dedup import shingle_hashes
+
+# ------------------------------------------------------------
+# CONFIGURATION
+# ------------------------------------------------------------
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1200"))
+CONTEXT_CANDIDATES = int(os.getenv("CONTEXT_CANDIDATES", "12"))
+CONTEXT_REDUNDANCY = float(os.getenv("CONTEXT_REDUNDANCY", "0.8"))
+CONTEXT_MERGE_GAP = int(os.getenv("CONTEXT_MERGE_GAP", "2"))  # chars between "adjacent" chunks
+# Savings are reported against the old prompt: the top CONTEXT_BASELINE_K hits joined as-is
+CONTEXT_BASELINE_K = int(os.getenv("CONTEXT_BASELINE_K", "5"))
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough LLM token count (~4 characters per token)."""
+    return (len(text) + 3) // 4
+
+
+# ------------------------------------------------------------
+# CONTEXT PACKER
+# ------------------------------------------------------------
+def merge_spans(hits) -> List[Dict[str, Any]]:
+    """
+    Stitches chunks of the same page and source whose character ranges
+    overlap or touch back into one continuous span. Chunks without
+    offsets (figure descriptions, older ingests) stay as they are.
+    """
+    spans, groups = [], {}
+    for h in hits:
+        p = h.payload
+        span = {"ids": [h.id], "doc_id": p.get("doc_id"), "page": p.get("page"), "source": p.get("source"),
+                "start": p.get("start"), "end": p.get("end"), "text": p.get("text") or "", "score": h.score}
+        if span["start"] is None or span["end"] is None:
+            spans.append(span)
+        else:
+            groups.setdefault((span["doc_id"], span["page"], span["source"]), []).append(span)
+
+    for members in groups.values():
+        members.sort(key=lambda s: s["start"])
+        cur = members[0]
+        for nxt in members[1:]:
+            if nxt["start"] <= cur["end"] + CONTEXT_MERGE_GAP:
+                if nxt["end"] > cur["end"]:
+                    overlap = cur["end"] - nxt["start"]
+                    cur["text"] = cur["text"] + nxt["text"][overlap:] if overlap >= 0 else cur["text"] + " " + nxt["text"]
+                    cur["end"] = nxt["end"]
+                cur["ids"] += nxt["ids"]
+                cur["score"] = max(cur["score"], nxt["score"])
+            else:
+                spans.append(cur)
+                cur = nxt
+        spans.append(cur)
+    return spans
+
+
+def pack_context(hits, budget: int = CONTEXT_TOKEN_BUDGET,
+                 redundancy: float = CONTEXT_REDUNDANCY) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+    """
+    Packs retrieved chunks into at most `budget` prompt tokens.
+
+    Overlapping chunks are merged, then spans are taken best-score first,
+    skipping any whose shingles are already `redundancy`-covered by chosen
+    spans and any that no longer fit. Chosen spans come back in page order,
+    with stats comparing against joining the top CONTEXT_BASELINE_K hits
+    as-is (negative savings mean the packed prompt is larger).
+    """
+    spans = sorted(merge_spans(hits), key=lambda s: -s["score"])
+    chosen, seen, used = [], set(), 0
+    stats = {"candidates": len(hits), "spans": len(spans), "redundant": 0, "over_budget": 0}
+
+    for span in spans:
+        shingles = set(shingle_hashes(span["text"]).tolist())
+        if shingles and len(shingles & seen) >= redundancy * len(shingles):
+            stats["redundant"] += 1
+            continue
+        tokens = estimate_tokens(span["text"])
+        if used + tokens > budget:
+            if chosen:
+                stats["over_budget"] += 1
+                continue
+            span["text"] = span["text"][:budget * 4]
+            tokens = estimate_tokens(span["text"])
+        chosen.append(span)
+        seen |= shingles
+        used += tokens
+
+    chosen.sort(key=lambda s: (str(s["doc_id"]), s["page"] if s["page"] is not None else -1, s["start"] or 0))
+    stats["baseline_tokens"] = sum(estimate_tokens(h.payload.get("text") or "") for h in hits[:CONTEXT_BASELINE_K])
+    stats["packed_tokens"] = used
+    stats["saved_tokens"] = stats["baseline_tokens"] - used
+    return chosen, stats
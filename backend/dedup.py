@@ -0,0 +1,147 @@
+import os
+import re
+import zlib
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+# ------------------------------------------------------------
+# CONFIGURATION
+# ------------------------------------------------------------
+DEDUP_ENABLED = os.getenv("DEDUP_CHUNKS", "1") == "1"
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.8"))
+DEDUP_NUM_PERM = int(os.getenv("DEDUP_NUM_PERM", "64"))
+DEDUP_BANDS = int(os.getenv("DEDUP_BANDS", "16"))
+DEDUP_SHINGLE = int(os.getenv("DEDUP_SHINGLE", "3"))
+
+# Lower rank wins when picking the chunk to keep from a cluster.
+SOURCE_PREFERENCE = {"text": 0, "ocr": 1}
+
+_MERSENNE = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_TOKEN = re.compile(r"\w+")
+
+
+def shingle_hashes(text: str, k: int = DEDUP_SHINGLE) -> np.ndarray:
+    """crc32 of every k-word shingle of the normalised text (case and punctuation ignored)."""
+    words = _TOKEN.findall(text.lower())
+    if not words:
+        return np.empty(0, dtype=np.uint64)
+    grams = {" ".join(words[i:i + k]) for i in range(max(1, len(words) - k + 1))}
+    return np.fromiter((zlib.crc32(g.encode()) for g in grams), dtype=np.uint64, count=len(grams))
+
+
+class MinHasher:
+    """MinHash signatures using universal hashing (a*x + b) mod p over 32-bit shingle hashes."""
+
+    def __init__(self, num_perm: int = DEDUP_NUM_PERM, seed: int = 1):
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self.a = rng.randint(1, 1 << 31, size=num_perm, dtype=np.int64).astype(np.uint64)
+        self.b = rng.randint(0, 1 << 31, size=num_perm, dtype=np.int64).astype(np.uint64)
+
+    def signature(self, hashes: np.ndarray) -> np.ndarray:
+        if hashes.size == 0:
+            return np.full(self.num_perm, _MAX_HASH, dtype=np.uint64)
+        perms = (np.outer(hashes, self.a) + self.b) % _MERSENNE & _MAX_HASH
+        return perms.min(axis=0)
+
+
+# ------------------------------------------------------------
+# NEAR-DUPLICATE ELIMINATION
+# ------------------------------------------------------------
+def _find(parent: List[int], i: int) -> int:
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def dedup_chunks(chunks: List[Dict], threshold: float = DEDUP_THRESHOLD, num_perm: int = DEDUP_NUM_PERM,
+                 bands: int = DEDUP_BANDS) -> Tuple[List[Dict], int]:
+    """
+    Drops near-duplicate text/OCR chunks of one document.
+
+    Chunks are MinHashed over word shingles and bucketed with LSH
+    (`bands` bands of num_perm / bands rows), so only chunks sharing a
+    bucket are compared. Candidates whose estimated Jaccard similarity
+    reaches `threshold` are clustered; each cluster keeps one chunk,
+    preferring the text layer over OCR, then the longer text. Other
+    sources (e.g. figure descriptions) are passed through untouched.
+    Returns (kept chunks in original order, number removed).
+    """
+    idx = [i for i, c in enumerate(chunks) if c.get("source", "text") in SOURCE_PREFERENCE]
+    if not DEDUP_ENABLED or len(idx) < 2:
+        return chunks, 0
+
+    hasher = MinHasher(num_perm)
+    sigs = np.stack([hasher.signature(shingle_hashes(chunks[i]["text"])) for i in idx])
+    rows = max(1, num_perm // bands)
+
+    parent = list(range(len(idx)))
+    for band in range(0, rows * bands, rows):
+        buckets = {}
+        for pos, sig in enumerate(sigs[:, band:band + rows]):
+            buckets.setdefault(sig.tobytes(), []).append(pos)
+        for members in buckets.values():
+            if len(members) < 2:
+                continue
+            head = members[0]
+            for other in members[1:]:
+                ra, rb = _find(parent, head), _find(parent, other)
+                if ra != rb and np.mean(sigs[head] == sigs[other]) >= threshold:
+                    parent[rb] = ra
+
+    clusters = {}
+    for pos in range(len(idx)):
+        clusters.setdefault(_find(parent, pos), []).append(pos)
+
+    drop = set()
+    for members in clusters.values():
+        if len(members) < 2:
+            continue
+        keep = min(members, key=lambda p: (SOURCE_PREFERENCE[chunks[idx[p]].get("source", "text")],
+                                           -len(chunks[idx[p]]["text"]), p))
+        drop.update(idx[p] for p in members if p != keep)
+
+    return [c for i, c in enumerate(chunks) if i not in drop], len(drop)
+
+
+class ChunkDeduper:
+    """
+    `dedup_chunks` for a document that arrives in segments. Each segment is
+    de-duplicated on its own, then its survivors are checked against the
+    chunks kept from earlier segments; those are already stored, so they win.
+    """
+
+    def __init__(self, threshold: float = DEDUP_THRESHOLD, num_perm: int = DEDUP_NUM_PERM,
+                 bands: int = DEDUP_BANDS):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = max(1, num_perm // bands)
+        self.hasher = MinHasher(num_perm)
+        self.buckets = {}
+        self.sigs = []
+
+    def __call__(self, chunks: List[Dict]) -> Tuple[List[Dict], int]:
+        kept, removed = dedup_chunks(chunks, self.threshold, self.num_perm, self.bands)
+        if not DEDUP_ENABLED:
+            return kept, removed
+
+        result = []
+        for chunk in kept:
+            if chunk.get("source", "text") not in SOURCE_PREFERENCE:
+                result.append(chunk)
+                continue
+            sig = self.hasher.signature(shingle_hashes(chunk["text"]))
+            keys = [(band, sig[band:band + self.rows].tobytes()) for band in range(0, self.rows * self.bands, self.rows)]
+            candidates = {j for key in keys for j in self.buckets.get(key, ())}
+            if any(np.mean(self.sigs[j] == sig) >= self.threshold for j in candidates):
+                removed += 1
+                continue
+            for key in keys:
+                self.buckets.setdefault(key, []).append(len(self.sigs))
+            self.sigs.append(sig)
+            result.append(chunk)
+        return result, removed
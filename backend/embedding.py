@@ -0,0 +1,172 @@
+import os
+import queue
+import threading
+import time
+import asyncio
+from concurrent.futures import Future
+from typing import List, Optional
+
+import numpy as np
+from onnx_backend import load_sentence_model, EMBED_BACKEND
+
+# ------------------------------------------------------------
+# CONFIGURATION
+# ------------------------------------------------------------
+EMBED_MODEL_NAME = os.getenv("EMBED_MODEL_NAME", "all-MiniLM-L6-v2")
+EMBED_MAX_BATCH = int(os.getenv("EMBED_MAX_BATCH", "32"))
+EMBED_MAX_WAIT_MS = float(os.getenv("EMBED_MAX_WAIT_MS", "5"))
+
+_STATS_WINDOW = 1024
+
+
+# ------------------------------------------------------------
+# EMBEDDING ENGINE
+# ------------------------------------------------------------
+class EmbeddingEngine:
+    """
+    Holds one embedding model per process and micro-batches query encodes.
+
+    Callers submit single texts; a worker thread gathers whatever arrives
+    within `max_wait_ms` (up to `max_batch_size` texts) and runs them through
+    the model in one forward pass. Each caller gets its own vector back.
+    """
+
+    def __init__(self, model, max_batch_size: int = EMBED_MAX_BATCH, max_wait_ms: float = EMBED_MAX_WAIT_MS):
+        self.model = model
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._batch_sizes = []
+        self._queue_waits_ms = []
+        self._batches = 0
+        self._items = 0
+
+        self._worker = threading.Thread(target=self._run, name="embedding-engine", daemon=True)
+        self._worker.start()
+
+    # -- public API ------------------------------------------------
+    def submit(self, text: str) -> Future:
+        """Queue one text for encoding and return a future for its vector."""
+        fut = Future()
+        self._queue.put((text, fut, time.perf_counter()))
+        return fut
+
+    def encode(self, text: str) -> np.ndarray:
+        """Blocking encode of a single text through the micro-batcher."""
+        return self.submit(text).result()
+
+    async def aencode(self, text: str) -> np.ndarray:
+        """Awaitable encode; lets concurrent requests share one batch."""
+        return await asyncio.wrap_future(self.submit(text))
+
+    def encode_batch(self, texts: List[str], batch_size: Optional[int] = None) -> np.ndarray:
+        """Encode an already-batched list directly, bypassing the queue."""
+        return self.model.encode(
+            texts,
+            batch_size=batch_size or self.max_batch_size,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        )
+
+    def stats(self):
+        """Batch-size and queue-wait statistics over the recent window."""
+        with self._stats_lock:
+            sizes = list(self._batch_sizes)
+            waits = list(self._queue_waits_ms)
+            batches, items = self._batches, self._items
+
+        result = {
+            "model": EMBED_MODEL_NAME,
+            "backend": EMBED_BACKEND,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": round(self.max_wait * 1000, 2),
+            "batches": batches,
+            "items": items,
+            "queue_depth": self._queue.qsize(),
+        }
+        if sizes:
+            result["batch_size_avg"] = round(float(np.mean(sizes)), 2)
+            result["batch_size_max"] = int(max(sizes))
+        if waits:
+            result["queue_wait_ms_avg"] = round(float(np.mean(waits)), 2)
+            result["queue_wait_ms_p95"] = round(float(np.percentile(waits, 95)), 2)
+            result["queue_wait_ms_max"] = round(float(max(waits)), 2)
+        return result
+
+    # -- worker ------------------------------------------------------
+    def _collect(self):
+        """Block for the first item, then gather more until full or the wait expires."""
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            # Callers that were cancelled while queued (e.g. a client disconnect) drop out here
+            batch = [item for item in self._collect() if item[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            started = time.perf_counter()
+            texts = [text for text, _, _ in batch]
+            try:
+                vectors = self.encode_batch(texts)
+            except Exception as e:
+                self._deliver(batch, error=e)
+                continue
+
+            self._deliver(batch, vectors)
+            self._record(len(batch), [(started - enq) * 1000 for _, _, enq in batch])
+
+    @staticmethod
+    def _deliver(batch, vectors=None, error: Optional[Exception] = None):
+        # One bad future must never end the worker loop: every later encode would hang
+        for i, (_, fut, _) in enumerate(batch):
+            try:
+                if error is not None:
+                    fut.set_exception(error)
+                else:
+                    fut.set_result(vectors[i])
+            except Exception as e:
+                print(f"Embedding engine could not deliver a result: {e}")
+
+    def _record(self, size: int, waits_ms: List[float]):
+        with self._stats_lock:
+            self._batches += 1
+            self._items += size
+            self._batch_sizes.append(size)
+            self._queue_waits_ms.extend(waits_ms)
+            del self._batch_sizes[:-_STATS_WINDOW]
+            del self._queue_waits_ms[:-_STATS_WINDOW]
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def engine_loaded() -> bool:
+    return _engine is not None
+
+
+def get_embedding_engine() -> EmbeddingEngine:
+    """
+    Return the process-wide engine, loading the model on first use, or a
+    client for the shared model server when one is configured.
+    """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                from model_server import get_model_client, RemoteEmbeddingEngine
+                client = get_model_client()
+                _engine = RemoteEmbeddingEngine(client) if client else EmbeddingEngine(load_sentence_model(EMBED_MODEL_NAME))
+    return _engine
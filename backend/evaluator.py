@@ -0,0 +1,97 @@
+import os
+import queue
+import random
+import threading
+import time
+from typing import Any, Dict
+
+import metrics
+from instrumentation import stage_timer
+
+# ------------------------------------------------------------
+# CONFIGURATION
+# ------------------------------------------------------------
+EVAL_SAMPLE_RATE = float(os.getenv("EVAL_SAMPLE_RATE", "1.0"))
+EVAL_BATCH_SIZE = int(os.getenv("EVAL_BATCH_SIZE", "16"))
+EVAL_MAX_WAIT_S = float(os.getenv("EVAL_MAX_WAIT_S", "2.0"))
+EVAL_MAX_PENDING = int(os.getenv("EVAL_MAX_PENDING", "1000"))
+
+
+# ------------------------------------------------------------
+# BACKGROUND EVALUATOR
+# ------------------------------------------------------------
+class BackgroundEvaluator:
+    """
+    Scores answers off the request path.
+
+    /query hands over a sampled fraction of its answers; a worker thread
+    drains them in batches through metrics.evaluate_batch and writes the
+    results with metrics.log_metrics. When the queue is full new items are
+    dropped rather than slowing requests down.
+    """
+
+    def __init__(self, sample_rate: float = EVAL_SAMPLE_RATE, batch_size: int = EVAL_BATCH_SIZE,
+                 max_wait_s: float = EVAL_MAX_WAIT_S, max_pending: int = EVAL_MAX_PENDING):
+        self.sample_rate = sample_rate
+        self.batch_size = max(1, batch_size)
+        self.max_wait_s = max_wait_s
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._stats = {"submitted": 0, "sampled_out": 0, "dropped": 0, "evaluated": 0, "batches": 0, "errors": 0}
+        self._worker = threading.Thread(target=self._run, name="evaluator", daemon=True)
+        self._worker.start()
+
+    def submit(self, item: Dict[str, Any], timings: Dict[str, float]) -> bool:
+        """Queues an evaluate_answer-style item; returns False if it was sampled out or dropped."""
+        self._stats["submitted"] += 1
+        if random.random() >= self.sample_rate:
+            self._stats["sampled_out"] += 1
+            return False
+        try:
+            self._queue.put_nowait((item, timings))
+            return True
+        except queue.Full:
+            self._stats["dropped"] += 1
+            return False
+
+    def stats(self) -> Dict[str, Any]:
+        return {"sample_rate": self.sample_rate, "pending": self._queue.qsize(), **self._stats}
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait_s
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            try:
+                with stage_timer("evaluate", "batch"):
+                    results = metrics.evaluate_batch([item for item, _ in batch], batch_size=self.batch_size)
+            except Exception as e:
+                self._stats["errors"] += 1
+                print(f"Evaluation batch failed: {e}")
+                continue
+
+            for (item, timings), result in zip(batch, results):
+                result.update(timings)
+                try:
+                    metrics.log_metrics(item["query"], item["answer"], result)
+                except Exception as e:
+                    self._stats["errors"] += 1
+                    print(f"Metrics logging failed: {e}")
+
+                print("\n===== QUERY EVALUATION METRICS =====")
+                for k, v in result.items():
+                    print(f"{k}: {v}")
+                print("=====================================\n")
+
+            self._stats["evaluated"] += len(batch)
+            self._stats["batches"] += 1
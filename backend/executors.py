@@ -0,0 +1,130 @@
+import asyncio
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, Dict
+
+# ------------------------------------------------------------
+# CONFIGURATION
+# ------------------------------------------------------------
+# Blocking work is split by kind so a burst of one (e.g. slow LLM calls)
+# cannot starve the others (vector search, embedding, file I/O).
+EXECUTOR_SIZES = {
+    "embed": int(os.getenv("EMBED_WORKERS", "2")),
+    "search": int(os.getenv("SEARCH_WORKERS", "8")),
+    "generate": int(os.getenv("GENERATE_WORKERS", "16")),
+    "io": int(os.getenv("IO_WORKERS", "4")),
+}
+
+# Per route class: concurrent requests, requests allowed to wait for a slot, and how long they may wait
+ROUTE_LIMITS = {
+    "query": (int(os.getenv("QUERY_CONCURRENCY", "16")), int(os.getenv("QUERY_MAX_WAITING", "32"))),
+    "batch": (int(os.getenv("BATCH_CONCURRENCY", "2")), int(os.getenv("BATCH_MAX_WAITING", "2"))),
+    "upload": (int(os.getenv("UPLOAD_CONCURRENCY", "4")), int(os.getenv("UPLOAD_MAX_WAITING", "4"))),
+}
+ROUTE_WAIT_TIMEOUT_S = float(os.getenv("ROUTE_WAIT_TIMEOUT_S", "2.0"))
+
+
+class Overloaded(Exception):
+    """A route class is at its limit; `status` is 429 (too many waiting) or 503 (waited too long)."""
+
+    def __init__(self, status: int, message: str, retry_after_s: float = 1.0):
+        super().__init__(message)
+        self.status = status
+        self.retry_after_s = retry_after_s
+
+
+# ------------------------------------------------------------
+# EXECUTORS
+# ------------------------------------------------------------
+_executors: Dict[str, ThreadPoolExecutor] = {}
+_executors_lock = threading.Lock()
+
+
+def get_executor(kind: str) -> ThreadPoolExecutor:
+    if kind not in _executors:
+        with _executors_lock:
+            if kind not in _executors:
+                _executors[kind] = ThreadPoolExecutor(max_workers=EXECUTOR_SIZES[kind], thread_name_prefix=kind)
+    return _executors[kind]
+
+
+async def run_in(kind: str, fn, *args, **kwargs):
+    """Runs a blocking call on the `kind` executor without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(kind), functools.partial(fn, *args, **kwargs))
+
+
+def executor_stats() -> Dict[str, Any]:
+    stats = {}
+    for kind, size in EXECUTOR_SIZES.items():
+        pool = _executors.get(kind)
+        stats[kind] = {"workers": size, "queued": pool._work_queue.qsize() if pool else 0}
+    return stats
+
+
+# ------------------------------------------------------------
+# ROUTE LIMITS
+# ------------------------------------------------------------
+class RouteLimiter:
+    """
+    Admission control for one route class.
+
+    Up to `max_concurrent` requests run at once and up to `max_waiting`
+    more may wait `wait_timeout_s` for a slot. Beyond that requests are
+    shed with Overloaded(429); a waiter that times out gets Overloaded(503).
+    """
+
+    def __init__(self, name: str, max_concurrent: int, max_waiting: int,
+                 wait_timeout_s: float = ROUTE_WAIT_TIMEOUT_S):
+        self.name = name
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_waiting = max(0, max_waiting)
+        self.wait_timeout_s = wait_timeout_s
+        self._sem = None
+        self._waiting = 0
+        self._stats = {"admitted": 0, "rejected": 0, "timed_out": 0}
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        # Created lazily so it binds to the server's event loop
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self.max_concurrent)
+        return self._sem
+
+    async def acquire(self):
+        sem = self._semaphore()
+        if sem.locked():
+            if self._waiting >= self.max_waiting:
+                self._stats["rejected"] += 1
+                raise Overloaded(429, f"Too many concurrent {self.name} requests")
+            self._waiting += 1
+            try:
+                await asyncio.wait_for(sem.acquire(), timeout=self.wait_timeout_s)
+            except asyncio.TimeoutError:
+                self._stats["timed_out"] += 1
+                raise Overloaded(503, f"{self.name} capacity exhausted, try again shortly")
+            finally:
+                self._waiting -= 1
+        else:
+            await sem.acquire()
+        self._stats["admitted"] += 1
+
+    def release(self):
+        self._semaphore().release()
+
+    @asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> Dict[str, Any]:
+        in_flight = self.max_concurrent - self._sem._value if self._sem else 0
+        return {"limit": self.max_concurrent, "in_flight": in_flight, "waiting": self._waiting, **self._stats}
+
+
+ROUTE_LIMITERS = {name: RouteLimiter(name, *limits) for name, limits in ROUTE_LIMITS.items()}
@@ -0,0 +1,238 @@
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from typing import Any, Dict, Iterable, Tuple
+
+import numpy as np
+from PIL import Image
+
+# ------------------------------------------------------------
+# CONFIGURATION
+# ------------------------------------------------------------
+GEMINI_RPM = float(os.getenv("GEMINI_RPM", "10"))
+GEMINI_TPM = float(os.getenv("GEMINI_TPM", "250000"))
+FIGURE_TOKENS_PER_CALL = int(os.getenv("FIGURE_TOKENS_PER_CALL", "1500"))
+FIGURE_CONCURRENCY = int(os.getenv("FIGURE_CONCURRENCY", "4"))
+FIGURE_MAX_RETRIES = int(os.getenv("FIGURE_MAX_RETRIES", "5"))
+FIGURE_BACKOFF_BASE = float(os.getenv("FIGURE_BACKOFF_BASE", "2.0"))
+FIGURE_PREFILTER = os.getenv("FIGURE_PREFILTER", "1") == "1"
+FIGURE_BACKEND = os.getenv("FIGURE_BACKEND", "gemini")  # "gemini" or "stub"
+STUB_FIGURE_REPLY = os.getenv("STUB_FIGURE_REPLY", "")
+
+NO_FIGURE = "NO_FIGURE"
+
+
+# ------------------------------------------------------------
+# RATE LIMITING
+# ------------------------------------------------------------
+class TokenBucket:
+    """Token bucket refilled continuously at `rate_per_minute`."""
+
+    def __init__(self, rate_per_minute: float, capacity: float = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        """Takes `amount` tokens and returns how long the caller must wait before using them."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= min(amount, self.capacity)
+            return max(0.0, -self.tokens / self.rate)
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute limits, as in the Gemini quota."""
+
+    def __init__(self, rpm: float = GEMINI_RPM, tpm: float = GEMINI_TPM):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+
+    def acquire(self, tokens: int = FIGURE_TOKENS_PER_CALL):
+        wait = max(self.requests.reserve(1), self.tokens.reserve(tokens))
+        if wait > 0:
+            time.sleep(wait)
+
+
+_THROTTLE_MESSAGE = re.compile(r"\b(?:429 too many requests|too many requests|resource[ _]exhausted"
+                               r"|quota exceeded|exceeded[\w ]{0,40}quota|rate[ -]limit(?:ed)?)\b", re.IGNORECASE)
+
+
+def is_throttle_error(e: Exception) -> bool:
+    """True for quota / 429 errors, which are the only ones worth retrying."""
+    for code in (getattr(e, "code", None), getattr(e, "status_code", None)):
+        if code == 429 or getattr(code, "value", None) == 429:
+            return True
+    if type(e).__name__ in ("ResourceExhausted", "TooManyRequests"):
+        return True
+    # Errors without a status: match whole phrases, not any "429" in an id or byte count
+    return _THROTTLE_MESSAGE.search(str(e)) is not None
+
+
+# ------------------------------------------------------------
+# LOCAL CHART PRE-FILTER
+# ------------------------------------------------------------
+def figure_features(img: Image.Image, max_side: int = 512) -> Dict[str, float]:
+    """
+    Cheap image statistics that separate plain text pages from charts and diagrams:
+    edge density, long axis-like lines, coloured area and large filled regions.
+    """
+    small = img.copy()
+    small.thumbnail((max_side, max_side))
+    rgb = np.asarray(small.convert("RGB"), dtype=np.float32) / 255.0
+    gray = rgb.mean(axis=2)
+
+    gx = np.abs(np.diff(gray, axis=1))
+    gy = np.abs(np.diff(gray, axis=0))
+    edges = np.zeros_like(gray, dtype=bool)
+    edges[:, 1:] |= gx > 0.25
+    edges[1:, :] |= gy > 0.25
+
+    dark = gray < 0.5
+    h_lines = int((dark.mean(axis=1) > 0.35).sum())
+    v_lines = int((dark.mean(axis=0) > 0.35).sum())
+
+    saturation = rgb.max(axis=2) - rgb.min(axis=2)
+    colored = float((saturation > 0.25).mean())
+
+    # Tiles that are inked but have few edges are filled shapes (bars, areas, photos)
+    tile = 16
+    th, tw = gray.shape[0] // tile, gray.shape[1] // tile
+    filled = 0.0
+    if th and tw:
+        ink = (gray[:th * tile, :tw * tile] < 0.85).reshape(th, tile, tw, tile).mean(axis=(1, 3))
+        edge_tiles = edges[:th * tile, :tw * tile].reshape(th, tile, tw, tile).mean(axis=(1, 3))
+        filled = float(((ink > 0.6) & (edge_tiles < 0.1)).mean())
+
+    return {
+        "edge_density": round(float(edges.mean()), 4),
+        "h_lines": h_lines,
+        "v_lines": v_lines,
+        "colored": round(colored, 4),
+        "filled": round(filled, 4),
+    }
+
+
+def looks_like_figure(img: Image.Image) -> bool:
+    """Decides locally whether a page is worth sending to Gemini."""
+    f = figure_features(img)
+    has_axes = f["h_lines"] >= 1 and f["v_lines"] >= 1
+    return has_axes or f["colored"] > 0.05 or f["filled"] > 0.08
+
+
+# ------------------------------------------------------------
+# STUB MODEL
+# ------------------------------------------------------------
+class StubFigureModel:
+    """
+    Local stand-in for the Gemini vision model, for tests and offline runs.
+
+    Each call takes the next item of `responses`: a string is the reply and
+    an exception is raised. Once they run out, `reply` answers: a string,
+    or a callable on the prompt parts. Calls are recorded in `calls`.
+    """
+
+    def __init__(self, responses=(), reply=None):
+        self.responses = list(responses)
+        self.reply = reply if reply is not None else (STUB_FIGURE_REPLY or NO_FIGURE)
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def generate_content(self, parts):
+        with self._lock:
+            self.calls.append(parts)
+            item = self.responses.pop(0) if self.responses else self.reply
+        if isinstance(item, BaseException):
+            raise item
+        return SimpleNamespace(text=item(parts) if callable(item) else item)
+
+
+# ------------------------------------------------------------
+# FIGURE EXTRACTOR
+# ------------------------------------------------------------
+class FigureExtractor:
+    """
+    Describes charts and diagrams with a Gemini model under a shared rate limit.
+
+    Pages are pre-filtered locally, then described with bounded concurrency.
+    A single prompt both checks for a figure and describes it, so each
+    candidate page costs one call. Throttling errors are retried with
+    exponential backoff; any other error skips the page.
+    """
+
+    def __init__(self, model, limiter: RateLimiter = None, concurrency: int = FIGURE_CONCURRENCY,
+                 max_retries: int = FIGURE_MAX_RETRIES, prefilter: bool = FIGURE_PREFILTER):
+        self.model = model
+        self.limiter = limiter or RateLimiter()
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max_retries
+        self.prefilter = prefilter
+        self.stats = {"pages": 0, "prefiltered": 0, "calls": 0, "retries": 0, "errors": 0, "figures": 0}
+        self.failed_pages = set()
+        self._stats_lock = threading.Lock()
+
+    def _count(self, key: str, n: int = 1):
+        with self._stats_lock:
+            self.stats[key] += n
+
+    def _generate(self, parts):
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            self._count("calls")
+            try:
+                return self.model.generate_content(parts).text
+            except Exception as e:
+                if not is_throttle_error(e) or attempt == self.max_retries:
+                    raise
+                self._count("retries")
+                time.sleep(FIGURE_BACKOFF_BASE * (2 ** attempt) * (0.5 + random.random()))
+
+    def describe(self, page_num: int, img: Image.Image):
+        """Returns a description of the figure on the page, or None."""
+        prompt = (
+            f"If this page contains no chart or diagram, reply exactly {NO_FIGURE}. "
+            f"Otherwise describe the figure from Page {page_num} in detail — steps, labels, and data."
+        )
+        try:
+            text = self._generate([prompt, img])
+        except Exception:
+            self._count("errors")
+            self.failed_pages.add(page_num)
+            return None
+        if not text or NO_FIGURE in text.strip().upper()[:len(NO_FIGURE) + 4]:
+            return None
+        self._count("figures")
+        return text
+
+    def extract(self, page_images: Iterable[Tuple[int, Image.Image]]) -> Dict[str, Any]:
+        """Returns {"Page N": description} for every page with a figure."""
+        graph_data = {}
+        window = threading.BoundedSemaphore(self.concurrency * 2)
+
+        def run(page_num, img):
+            try:
+                desc = self.describe(page_num, img)
+                if desc:
+                    graph_data[f"Page {page_num}"] = desc
+            finally:
+                window.release()
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="figures") as pool:
+            for page_num, img in page_images:
+                self._count("pages")
+                if self.prefilter and not looks_like_figure(img):
+                    self._count("prefiltered")
+                    continue
+                # Bound the number of rendered pages held in memory
+                window.acquire()
+                pool.submit(run, page_num, img)
+
+        return dict(sorted(graph_data.items(), key=lambda kv: int(kv[0].split()[-1])))
@@ -0,0 +1,108 @@
+import os
+import threading
+import time
+from typing import Iterator
+
+# ------------------------------------------------------------
+# CONFIGURATION
+# ------------------------------------------------------------
+GENERATOR_BACKEND = os.getenv("GENERATOR_BACKEND", "gemini")  # "gemini" or "stub"
+STUB_ANSWER = os.getenv("STUB_ANSWER", "")
+STUB_TOKEN_DELAY_MS = float(os.getenv("STUB_TOKEN_DELAY_MS", "20"))
+
+
+_genai_lock = threading.Lock()
+
+
+def gemini_model(api_key: str, model_name: str):
+    """
+    A Gemini model bound to its own API key. genai.configure is process-wide
+    and answers and figures use different keys, so the key is set and the
+    model's client created under one lock; the model keeps that client
+    whatever is configured later.
+    """
+    import google.generativeai as genai
+    from google.generativeai import client
+    with _genai_lock:
+        genai.configure(api_key=api_key)
+        model = genai.GenerativeModel(model_name=model_name)
+        model._client = client.get_default_generative_client()
+    return model
+
+
+# ------------------------------------------------------------
+# GENERATORS
+# ------------------------------------------------------------
+class Generator:
+    """Answer generator: `stream` yields text pieces as they are produced."""
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        raise NotImplementedError
+
+    def generate(self, prompt: str) -> str:
+        return "".join(self.stream(prompt))
+
+
+class GeminiGenerator(Generator):
+    def __init__(self, api_key: str, model_name: str):
+        self.model = gemini_model(api_key, model_name)
+
+    def generate(self, prompt: str) -> str:
+        return self.model.generate_content(prompt).text
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        for chunk in self.model.generate_content(prompt, stream=True):
+            if chunk.text:
+                yield chunk.text
+
+
+class StubGenerator(Generator):
+    """Local stand-in for tests and load runs: echoes a fixed answer word by word."""
+
+    def __init__(self, answer: str = STUB_ANSWER, token_delay_ms: float = STUB_TOKEN_DELAY_MS):
+        self.answer = answer
+        self.delay = token_delay_ms / 1000.0
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        answer = self.answer or f"Stub answer to: {prompt.strip().splitlines()[-1]}"
+        for i, word in enumerate(answer.split(" ")):
+            if self.delay:
+                time.sleep(self.delay)
+            yield word if i == 0 else " " + word
+
+
+class PieceStream:
+    """
+    Pulls a generator's pieces one `next` at a time from worker threads.
+    `close` waits for an in-flight `next` to return before closing the
+    generator, so it is safe from any thread, e.g. after a client disconnects.
+    """
+
+    def __init__(self, pieces: Iterator[str]):
+        self._pieces = pieces
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def next(self, default=None):
+        with self._lock:
+            if self._closed:
+                return default
+            return next(self._pieces, default)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            close = getattr(self._pieces, "close", None)
+            if close is not None:
+                close()
+
+
+def create_generator(backend: str = GENERATOR_BACKEND, **kwargs) -> Generator:
+    """Builds the configured generator ("gemini" or "stub")."""
+    if backend == "stub":
+        return StubGenerator()
+    if backend == "gemini":
+        if not kwargs.get("api_key"):
+            raise ValueError("GEMINI_API_NEW must be set.")
+        return GeminiGenerator(kwargs["api_key"], kwargs["model_name"])
+    raise ValueError(f"Unknown GENERATOR_BACKEND: {backend}")
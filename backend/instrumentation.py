@@ -0,0 +1,182 @@
+import os
+import random
+import re
+import threading
+import time
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import List, Sequence, Tuple
+
+try:
+    from pyinstrument import Profiler
+    PROFILER_AVAILABLE = True
+except Exception:
+    PROFILER_AVAILABLE = False
+
+# ------------------------------------------------------------
+# CONFIGURATION
+# ------------------------------------------------------------
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+# Whether clients may force a profile with the `X-Profile: 1` header
+PROFILE_REQUESTS = os.getenv("PROFILE_REQUESTS", "0") == "1"
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+# ------------------------------------------------------------
+# METRIC TYPES
+# ------------------------------------------------------------
+class Counter:
+    """Monotonic counter with labels."""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    """Fixed-bucket histogram with labels; observe() is a bisect and three adds."""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value: float, *labels: str):
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][idx] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {k: ([*v[0]], v[1], v[2]) for k, v in self._series.items()}
+        for labels, (counts, total, count) in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, c in zip(self.buckets, counts):
+                cumulative += c
+                le = _labels(self.labelnames, labels, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            le = _labels(self.labelnames, labels, 'le="+Inf"')
+            plain = _labels(self.labelnames, labels)
+            lines.append(f"{self.name}_bucket{le} {count}")
+            lines.append(f"{self.name}_sum{plain} {total}")
+            lines.append(f"{self.name}_count{plain} {count}")
+        return lines
+
+
+REGISTRY = []
+
+STAGE_SECONDS = Histogram(
+    "mrag_stage_seconds", "Time spent in each ingest and query stage.", ("pipeline", "stage"))
+HTTP_SECONDS = Histogram(
+    "mrag_http_request_seconds", "HTTP request latency by route.", ("method", "route", "status"))
+EVENTS = Counter("mrag_events_total", "Pipeline events (cache hits, pages, chunks, ...).", ("event",))
+
+
+# ------------------------------------------------------------
+# TIMERS
+# ------------------------------------------------------------
+class StageTimer:
+    __slots__ = ("start", "ms")
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.ms = 0.0
+
+
+@contextmanager
+def stage_timer(pipeline: str, stage: str):
+    """Times a block into mrag_stage_seconds; the yielded timer exposes `.ms` afterwards."""
+    timer = StageTimer()
+    try:
+        yield timer
+    finally:
+        elapsed = time.perf_counter() - timer.start
+        timer.ms = elapsed * 1000
+        STAGE_SECONDS.observe(elapsed, pipeline, stage)
+
+
+def observe_stage(pipeline: str, stage: str, seconds: float):
+    STAGE_SECONDS.observe(seconds, pipeline, stage)
+
+
+def count(event: str, amount: float = 1.0):
+    EVENTS.inc(event, amount=amount)
+
+
+def render_prometheus() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ------------------------------------------------------------
+# PROFILER HOOK
+# ------------------------------------------------------------
+@contextmanager
+def maybe_profile(name: str, force: bool = False):
+    """
+    Runs a sampling profiler around a request when sampled (PROFILE_SAMPLE_RATE)
+    or forced, and writes an HTML report to PROFILE_DIR. No-op without pyinstrument.
+    """
+    if not PROFILER_AVAILABLE or not (force or (PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE)):
+        yield
+        return
+
+    profiler = Profiler(async_mode="enabled")
+    profiler.start()
+    try:
+        yield
+    finally:
+        profiler.stop()
+        safe = re.sub(r"[^A-Za-z0-9_-]+", "_", name.strip("/"))[:80] or "root"
+        path = os.path.join(PROFILE_DIR, f"{safe}-{int(time.time() * 1000)}.html")
+        # Rendering and writing the report is slow; keep it off the request's thread (the event loop)
+        _profile_writer.submit(_write_profile, profiler, path)
+
+
+_profile_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="profile-writer")
+
+
+def _write_profile(profiler, path: str):
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(profiler.output_html())
+    except Exception as e:
+        print(f"Could not write profile {path}: {e}")
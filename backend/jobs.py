@@ -0,0 +1,312 @@
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+from instrumentation import observe_stage
+
+# ------------------------------------------------------------
+# CONFIGURATION
+# ------------------------------------------------------------
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+INGEST_MAX_PENDING = int(os.getenv("INGEST_MAX_PENDING", "16"))
+JOB_SCRATCH_ROOT = os.getenv("JOB_SCRATCH_ROOT", "job_scratch")
+JOB_HISTORY = int(os.getenv("JOB_HISTORY", "500"))
+# Job states are shared through SQLite so any API worker can answer /jobs/{id}
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", "jobs.sqlite3")
+JOB_SYNC_INTERVAL_S = float(os.getenv("JOB_SYNC_INTERVAL_S", "0.5"))
+
+
+class QueueFull(Exception):
+    """Raised when the ingestion queue is at capacity."""
+
+
+# Identifies this process across restarts: a restarted server (in a container,
+# usually) often gets the same pid back, so a pid alone cannot tell them apart
+BOOT_ID = uuid.uuid4().hex
+BOOT_TIME = time.time()
+
+
+def process_alive(pid) -> bool:
+    """Whether a process with this id is running on this host."""
+    try:
+        os.kill(int(pid), 0)
+    except (OSError, TypeError, ValueError):
+        return False
+    return True
+
+
+def _process_start_time(pid) -> Optional[float]:
+    """Wall-clock start time of a process where /proc exposes it (Linux), else None."""
+    try:
+        with open(f"/proc/{int(pid)}/stat") as f:
+            ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/stat") as f:
+            boot = next(int(line.split()[1]) for line in f if line.startswith("btime "))
+        return boot + ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, StopIteration, AttributeError):
+        return None
+
+
+def owner_record() -> Dict[str, Any]:
+    """Who is doing a piece of work, for owner_alive() in this or another process."""
+    return {"pid": os.getpid(), "boot_id": BOOT_ID, "boot_time": BOOT_TIME}
+
+
+def owner_alive(owner: Optional[Dict[str, Any]]) -> bool:
+    """
+    Whether the process in an owner_record() is still running. A record with
+    another boot token is orphaned if its pid is ours or gone, or if the
+    process now holding that pid started after the token was made.
+    """
+    if not owner:
+        return False
+    if owner.get("boot_id") == BOOT_ID:
+        return True
+    pid = owner.get("pid")
+    if pid is None or int(pid) == os.getpid() or not process_alive(pid):
+        return False
+    started = _process_start_time(pid)
+    return started is None or started <= owner.get("boot_time", 0.0) + 1.0
+
+
+# ------------------------------------------------------------
+# JOB
+# ------------------------------------------------------------
+class Job:
+    """One background ingestion run with per-stage progress and timings."""
+
+    def __init__(self, job_id: str, scratch_dir: str, **meta):
+        self.id = job_id
+        self.scratch_dir = scratch_dir
+        self.meta = meta
+        self.status = "queued"
+        self.stages = []
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._lock = threading.Lock()
+        self._publish = None  # set by JobQueue to share state with other workers
+
+    @contextmanager
+    def stage(self, name: str):
+        """Records the start, end and duration of a pipeline stage."""
+        entry = {"name": name, "status": "running", "progress": None, "ms": None}
+        with self._lock:
+            self.stages.append(entry)
+        self._changed(force=True)
+        start = time.perf_counter()
+        try:
+            yield entry
+        except BaseException:
+            # Cancellation and interrupts too, so no stage is left "running"
+            entry["status"] = "failed"
+            raise
+        else:
+            entry["status"] = "done"
+        finally:
+            elapsed = time.perf_counter() - start
+            entry["ms"] = round(elapsed * 1000, 2)
+            observe_stage("ingest", name, elapsed)
+            self._changed(force=True)
+
+    @contextmanager
+    def pipeline(self, names, total: Optional[int] = None):
+        """
+        Stages that run at the same time, e.g. pages moving through
+        OCR → figures → chunk → embed. Each is fed with `advance`; its `ms`
+        is the time spent in it, summed over its pieces of work.
+        """
+        entries = [{"name": name, "status": "running", "progress": {"done": 0, "total": total}, "ms": 0.0}
+                   for name in names]
+        with self._lock:
+            self.stages.extend(entries)
+        self._changed(force=True)
+        try:
+            yield entries
+        except BaseException:
+            for entry in entries:
+                entry["status"] = "failed"
+            raise
+        else:
+            for entry in entries:
+                entry["status"] = "done"
+        finally:
+            self._changed(force=True)
+
+    def advance(self, name: str, done: int = 0, ms: float = 0.0):
+        """Adds work finished by a pipeline stage: `done` more items, taking `ms`."""
+        with self._lock:
+            for entry in reversed(self.stages):
+                if entry["name"] == name:
+                    entry["progress"]["done"] += done
+                    entry["ms"] = round(entry["ms"] + ms, 2)
+                    break
+        self._changed()
+
+    def progress(self, done: int, total: Optional[int] = None):
+        """Updates progress of the currently running stage."""
+        with self._lock:
+            if self.stages:
+                self.stages[-1]["progress"] = {"done": done, "total": total}
+        self._changed()
+
+    def _changed(self, force: bool = False):
+        if self._publish is not None:
+            self._publish(self, force)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            stages = [dict(s) for s in self.stages]
+        elapsed_end = self.finished_at or time.time()
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            **self.meta,
+            "stages": stages,
+            "elapsed_ms": round((elapsed_end - (self.started_at or elapsed_end)) * 1000, 2),
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class StoredJob:
+    """A job state read back from the job database, e.g. one run by another worker."""
+
+    def __init__(self, state: Dict[str, Any], owner: Optional[Dict[str, Any]]):
+        self.state = state
+        if state["status"] in ("queued", "running") and not owner_alive(owner):
+            self.state = {**state, "status": "failed", "error": "Interrupted: the worker running it stopped"}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return self.state
+
+
+# ------------------------------------------------------------
+# JOB QUEUE
+# ------------------------------------------------------------
+class JobQueue:
+    """
+    Bounded background worker pool for ingestion jobs.
+
+    Each job gets its own scratch directory, removed when the job finishes,
+    so concurrent uploads never share intermediate files. Job states are
+    written through to SQLite (at most every JOB_SYNC_INTERVAL_S while
+    progress ticks), so every worker process can report on every job.
+    """
+
+    def __init__(self, max_workers: int = INGEST_WORKERS, max_pending: int = INGEST_MAX_PENDING,
+                 scratch_root: str = JOB_SCRATCH_ROOT, history: int = JOB_HISTORY,
+                 db_path: str = JOB_DB_PATH):
+        self.scratch_root = scratch_root
+        self.history = history
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest")
+        self._slots = threading.BoundedSemaphore(max_workers + max_pending)
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._saved_at = {}
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " job_id TEXT PRIMARY KEY, state TEXT NOT NULL, pid INTEGER NOT NULL, updated_at REAL NOT NULL,"
+            " owner TEXT)"
+        )
+        if "owner" not in {row[1] for row in self._db.execute("PRAGMA table_info(jobs)")}:
+            self._db.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+        self._db.commit()
+        self._db_lock = threading.Lock()
+        self._owner = json.dumps(owner_record())
+        os.makedirs(scratch_root, exist_ok=True)
+
+    def _save(self, job: Job, force: bool = True):
+        now = time.time()
+        if not force and now - self._saved_at.get(job.id, 0.0) < JOB_SYNC_INTERVAL_S:
+            return
+        self._saved_at[job.id] = now
+        state = json.dumps(job.to_dict())
+        with self._db_lock:
+            self._db.execute("INSERT OR REPLACE INTO jobs (job_id, state, pid, updated_at, owner)"
+                             " VALUES (?, ?, ?, ?, ?)", (job.id, state, os.getpid(), now, self._owner))
+            self._db.commit()
+
+    def create(self, **meta) -> Job:
+        """Reserves a queue slot and scratch directory; raises QueueFull if none is free."""
+        if not self._slots.acquire(blocking=False):
+            raise QueueFull("Ingestion queue is full, try again later.")
+        job_id = str(uuid.uuid4())
+        scratch_dir = os.path.join(self.scratch_root, job_id)
+        os.makedirs(scratch_dir, exist_ok=True)
+        job = Job(job_id, scratch_dir, **meta)
+        job._publish = self._save
+        with self._lock:
+            self._jobs[job_id] = job
+            self._prune()
+        self._save(job)
+        return job
+
+    def start(self, job: Job, fn: Callable[..., Any], *args, **kwargs):
+        """Runs fn(job, *args, **kwargs) on the worker pool."""
+        self._executor.submit(self._run, job, fn, args, kwargs)
+
+    def cancel(self, job: Job, error: str):
+        """Releases a created job that will never be started."""
+        job.status, job.error = "failed", error
+        self._finish(job)
+
+    def get(self, job_id: str):
+        """The live Job when this process runs it, else its last stored state (or None)."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            return job
+        with self._db_lock:
+            row = self._db.execute("SELECT state, owner FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return StoredJob(json.loads(row[0]), json.loads(row[1]) if row[1] else None) if row else None
+
+    def _run(self, job: Job, fn, args, kwargs):
+        job.status = "running"
+        job.started_at = time.time()
+        self._save(job)
+        try:
+            job.result = fn(job, *args, **kwargs)
+            job.status = "done"
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+        except BaseException as e:
+            job.status = "failed"
+            job.error = f"Interrupted: {type(e).__name__}"
+            raise
+        finally:
+            self._finish(job)
+
+    def _finish(self, job: Job):
+        job.finished_at = time.time()
+        shutil.rmtree(job.scratch_dir, ignore_errors=True)
+        self._save(job)
+        self._saved_at.pop(job.id, None)
+        self._slots.release()
+
+    def _prune(self):
+        # Drop the oldest finished jobs once history is exceeded
+        excess = len(self._jobs) - self.history
+        for job_id in list(self._jobs):
+            if excess <= 0:
+                break
+            if self._jobs[job_id].finished_at is not None:
+                del self._jobs[job_id]
+                excess -= 1
+        with self._db_lock:
+            self._db.execute("DELETE FROM jobs WHERE job_id NOT IN"
+                             " (SELECT job_id FROM jobs ORDER BY updated_at DESC LIMIT ?)", (self.history,))
+            self._db.commit()
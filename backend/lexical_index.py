@@ -0,0 +1,198 @@
+import json
+import math
+import os
+import re
+import shutil
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from vector_store import SearchHit
+
+# ------------------------------------------------------------
+# CONFIGURATION
+# ------------------------------------------------------------
+LEXICAL_INDEX_DIR = os.getenv("LEXICAL_INDEX_DIR", "lexical_index")
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+_TOKEN = re.compile(r"\w+")
+_QUOTED = re.compile(r'^\s*"[^"]+"\s*$')
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall((text or "").lower())
+
+
+def is_lexical_query(query: str) -> bool:
+    """
+    Queries that name exact terms rather than ask a question: a quoted
+    phrase, or up to three tokens that are all identifiers (containing a
+    digit) or upper-case names like FORMS. These skip the dense encode.
+    """
+    if _QUOTED.match(query):
+        return True
+    words = _TOKEN.findall(query)
+    return 0 < len(words) <= 3 and all(any(c.isdigit() for c in w) or (w.isupper() and len(w) > 1) for w in words)
+
+
+def reciprocal_rank_fusion(result_lists: Sequence[Sequence[SearchHit]], limit: int, k: int = RRF_K) -> List[SearchHit]:
+    """
+    Merges ranked hit lists by sum of 1 / (k + rank); the fused score replaces
+    the original. Hits are keyed by (doc_id, id), since per-document
+    collections number their points from 0.
+    """
+    scores, hits = {}, {}
+    for results in result_lists:
+        for rank, hit in enumerate(results, start=1):
+            key = (hit.payload.get("doc_id"), hit.id)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+            hits.setdefault(key, hit)
+    best = sorted(scores, key=scores.get, reverse=True)[:limit]
+    return [SearchHit(hits[key].id, scores[key], hits[key].payload) for key in best]
+
+
+# ------------------------------------------------------------
+# BUILD
+# ------------------------------------------------------------
+class LexicalIndexBuilder:
+    """
+    Accumulates one document's postings as its chunks stream past, then
+    writes them as sorted arrays: for each term (in sorted order) the chunk
+    numbers containing it and their term frequencies.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.tmp = path + ".tmp"
+        shutil.rmtree(self.tmp, ignore_errors=True)
+        os.makedirs(self.tmp)
+        self.postings = {}
+        self.ids, self.lengths = [], []
+        self._payloads = open(os.path.join(self.tmp, "payloads.jsonl"), "w", encoding="utf-8")
+
+    def add(self, point_id, payload: Dict[str, Any]):
+        tokens = tokenize(payload.get("text", ""))
+        chunk = len(self.ids)
+        for term, tf in Counter(tokens).items():
+            self.postings.setdefault(term, []).append((chunk, tf))
+        self.ids.append(point_id)
+        self.lengths.append(len(tokens))
+        self._payloads.write(json.dumps(payload) + "\n")
+
+    def finish(self):
+        self._payloads.close()
+        terms = sorted(self.postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(self.postings[t]) for t in terms])
+        flat = [p for t in terms for p in self.postings[t]]
+        np.save(os.path.join(self.tmp, "offsets.npy"), offsets)
+        np.save(os.path.join(self.tmp, "chunks.npy"), np.fromiter((c for c, _ in flat), dtype=np.int32, count=len(flat)))
+        np.save(os.path.join(self.tmp, "tfs.npy"),
+                np.fromiter((min(tf, 65535) for _, tf in flat), dtype=np.uint16, count=len(flat)))
+        np.save(os.path.join(self.tmp, "lengths.npy"), np.asarray(self.lengths, dtype=np.int32))
+        with open(os.path.join(self.tmp, "terms.json"), "w", encoding="utf-8") as f:
+            json.dump(terms, f)
+        with open(os.path.join(self.tmp, "ids.json"), "w") as f:
+            json.dump(self.ids, f)
+        shutil.rmtree(self.path, ignore_errors=True)
+        os.replace(self.tmp, self.path)
+
+    def abort(self):
+        self._payloads.close()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+
+# ------------------------------------------------------------
+# SEARCH
+# ------------------------------------------------------------
+class LexicalIndex:
+    """One document's BM25 index; the postings arrays are memory-mapped."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "terms.json"), encoding="utf-8") as f:
+            self.terms = {t: i for i, t in enumerate(json.load(f))}
+        with open(os.path.join(path, "ids.json")) as f:
+            self.ids = json.load(f)
+        self.offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")
+        self.chunks = np.load(os.path.join(path, "chunks.npy"), mmap_mode="r")
+        self.tfs = np.load(os.path.join(path, "tfs.npy"), mmap_mode="r")
+        self.lengths = np.load(os.path.join(path, "lengths.npy"))
+        self.avg_length = float(self.lengths.mean()) if self.lengths.size else 0.0
+        self._payloads = None
+
+    def payload(self, chunk: int) -> Dict[str, Any]:
+        if self._payloads is None:
+            with open(os.path.join(self.path, "payloads.jsonl"), encoding="utf-8") as f:
+                self._payloads = [json.loads(line) for line in f]
+        return self._payloads[chunk]
+
+    def search(self, terms: List[str], limit: int) -> List[SearchHit]:
+        n = len(self.ids)
+        if n == 0:
+            return []
+        scores = np.zeros(n, dtype=np.float32)
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths / max(self.avg_length, 1e-9))
+        for term in set(terms):
+            t = self.terms.get(term)
+            if t is None:
+                continue
+            start, end = int(self.offsets[t]), int(self.offsets[t + 1])
+            chunks = np.asarray(self.chunks[start:end])
+            tf = np.asarray(self.tfs[start:end], dtype=np.float32)
+            idf = math.log(1 + (n - (end - start) + 0.5) / ((end - start) + 0.5))
+            scores[chunks] += idf * tf * (BM25_K1 + 1) / (tf + norm[chunks])
+        matched = np.flatnonzero(scores)
+        if matched.size == 0:
+            return []
+        top = matched[np.argsort(-scores[matched])[:limit]]
+        return [SearchHit(self.ids[c], float(scores[c]), self.payload(int(c))) for c in top]
+
+
+class LexicalStore:
+    """Per-document lexical indexes under `root`, loaded lazily on first search."""
+
+    def __init__(self, root: str = LEXICAL_INDEX_DIR):
+        self.root = root
+        self._indexes = {}
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, doc_id: str) -> str:
+        return os.path.join(self.root, doc_id)
+
+    def builder(self, doc_id: str) -> LexicalIndexBuilder:
+        with self._lock:
+            self._indexes.pop(doc_id, None)
+        return LexicalIndexBuilder(self._path(doc_id))
+
+    def has(self, doc_id: str) -> bool:
+        return os.path.exists(os.path.join(self._path(doc_id), "ids.json"))
+
+    def get(self, doc_id: str) -> Optional[LexicalIndex]:
+        with self._lock:
+            index = self._indexes.get(doc_id)
+            if index is None and self.has(doc_id):
+                index = self._indexes[doc_id] = LexicalIndex(self._path(doc_id))
+            return index
+
+    def delete(self, doc_id: str):
+        with self._lock:
+            self._indexes.pop(doc_id, None)
+        shutil.rmtree(self._path(doc_id), ignore_errors=True)
+        shutil.rmtree(self._path(doc_id) + ".tmp", ignore_errors=True)
+
+    def search(self, doc_ids: List[str], query: str, limit: int) -> List[SearchHit]:
+        """BM25 hits across documents; documents without an index are skipped."""
+        terms = tokenize(query)
+        hits = []
+        for doc_id in doc_ids:
+            index = self.get(doc_id)
+            if index is not None:
+                hits.extend(index.search(terms, limit))
+        hits.sort(key=lambda h: h.score, reverse=True)
+        return hits[:limit]
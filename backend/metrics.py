@@ -246,32 +246,63 @@
 #     print(f"✅ Metrics computed and logged for query: {query[:60]}...")
 
 import numpy as np
-import torch
 import re
 import string
+import threading
 import time
-import pandas as pd
-from sklearn.metrics.pairwise import cosine_similarity
-from sentence_transformers import SentenceTransformer
+from onnx_backend import load_sentence_model
 from rouge import Rouge
 from difflib import SequenceMatcher
-from datetime import datetime
-from transformers import pipeline
+from metrics_sink import get_metrics_sink
+from model_server import get_model_client, RemoteSentenceModel, RemoteGrader
 
 # -------------------------------------------------------------------
-# Load better free models
+# Load better free models (lazily, on first use or background warm-up)
 # -------------------------------------------------------------------
-# all-mpnet-base-v2 gives much stronger semantic matching
-embedding_model = SentenceTransformer("sentence-transformers/all-mpnet-base-v2")
-
-# Optional lightweight open-source LLM for free evaluation (distilbart or t5)
-# You can download once; runs locally via Hugging Face
-faithfulness_grader = pipeline(
-    "text2text-generation",
-    model="google/flan-t5-base",
-    truncation=True,
-    max_length=256
-)
+_models = {}
+_models_lock = threading.Lock()
+
+
+def get_embedding_model():
+    # all-mpnet-base-v2 gives much stronger semantic matching
+    if "embedding" not in _models:
+        with _models_lock:
+            if "embedding" not in _models:
+                client = get_model_client()
+                _models["embedding"] = RemoteSentenceModel(client, "evaluation") if client \
+                    else load_sentence_model("sentence-transformers/all-mpnet-base-v2")
+    return _models["embedding"]
+
+
+def get_faithfulness_grader():
+    # Optional lightweight open-source LLM for free evaluation (distilbart or t5)
+    # You can download once; runs locally via Hugging Face
+    if "grader" not in _models:
+        with _models_lock:
+            if "grader" not in _models:
+                client = get_model_client()
+                if client:
+                    _models["grader"] = RemoteGrader(client)
+                    return _models["grader"]
+                # Only the in-process path needs transformers (and torch)
+                from transformers import pipeline
+                _models["grader"] = pipeline(
+                    "text2text-generation",
+                    model="google/flan-t5-base",
+                    truncation=True,
+                    max_length=256
+                )
+    return _models["grader"]
+
+
+def load_models():
+    """Loads both evaluation models; used by the startup warm-up."""
+    get_embedding_model()
+    get_faithfulness_grader()
+
+
+def models_loaded():
+    return "embedding" in _models and "grader" in _models
 
 rouge = Rouge()
 
@@ -286,6 +317,12 @@ def clean_text(text):
     text = text.translate(str.maketrans("", "", string.punctuation))
     return text.strip()
 
+def _cosine(u, v) -> float:
+    """Cosine similarity of two embedding vectors (numpy, so the API process needn't import torch)."""
+    u = np.asarray(u, dtype=np.float32)
+    v = np.asarray(v, dtype=np.float32)
+    return float(np.dot(u, v) / max(float(np.linalg.norm(u) * np.linalg.norm(v)), 1e-8))
+
 # -------------------------------------------------------------------
 # Core Metrics
 # -------------------------------------------------------------------
@@ -293,9 +330,8 @@ def semantic_similarity(a, b):
     """Compute semantic cosine similarity between two texts."""
     if not a or not b:
         return 0.0
-    emb = embedding_model.encode([a, b], convert_to_tensor=True, normalize_embeddings=True)
-    sim = torch.nn.functional.cosine_similarity(emb[0], emb[1], dim=0)
-    return float(sim.item())
+    emb = get_embedding_model().encode([a, b], normalize_embeddings=True)
+    return _cosine(emb[0], emb[1])
 
 def rouge_l_score(a, b):
     """Compute ROUGE-L F1."""
@@ -337,7 +373,7 @@ def faithfulness_score(answer, context):
             f"Output only a number.\n\n"
             f"CONTEXT:\n{context}\n\nANSWER:\n{answer}"
         )
-        llm_output = faithfulness_grader(prompt)[0]["generated_text"]
+        llm_output = get_faithfulness_grader()(prompt)[0]["generated_text"]
         llm_val = float(re.findall(r"0\.\d+|1\.0|1", llm_output)[0]) if re.search(r"\d", llm_output) else 0.5
     except Exception:
         llm_val = 0.5  # fallback if model fails
@@ -392,14 +428,95 @@ def evaluate_answer(query, answer, ground_truth="", retrieved_docs=None, relevan
     return result
 
 # -------------------------------------------------------------------
-# CSV Logging (same as before)
+# Batched Evaluation (used by the background evaluator)
+# -------------------------------------------------------------------
+def _parse_llm_score(llm_output):
+    try:
+        return float(re.findall(r"0\.\d+|1\.0|1", llm_output)[0]) if re.search(r"\d", llm_output) else 0.5
+    except Exception:
+        return 0.5
+
+
+def evaluate_batch(items, batch_size=16):
+    """
+    Evaluates many answers at once. Each item takes the same keyword arguments
+    as evaluate_answer. All mpnet encodes run as one batched call and all
+    flan-t5 grading prompts as another, instead of two encodes and one
+    generation per answer.
+    """
+    start = time.time()
+    prepared = []
+    for item in items:
+        answer = item.get("answer") or ""
+        ground_truth = item.get("ground_truth") or ""
+        context = " ".join(item.get("retrieved_docs") or []) or ground_truth
+        prepared.append((answer, ground_truth, context))
+
+    # One encode for every (answer, ground truth, context) text
+    texts, slots = [], []
+    for answer, ground_truth, context in prepared:
+        idx = {}
+        for name, text in (("answer", answer), ("ground_truth", ground_truth), ("context", context)):
+            if text:
+                idx[name] = len(texts)
+                texts.append(text)
+        slots.append(idx)
+    emb = None
+    if texts:
+        emb = get_embedding_model().encode(texts, batch_size=batch_size, normalize_embeddings=True)
+
+    def sim(idx, a, b):
+        if a not in idx or b not in idx:
+            return 0.0
+        return _cosine(emb[idx[a]], emb[idx[b]])
+
+    # One batched grader call for every answer that has context
+    graded = [i for i, (answer, _, context) in enumerate(prepared) if answer and context]
+    llm_vals = {}
+    if graded:
+        prompts = [
+            f"Rate factual alignment (0-1) between ANSWER and CONTEXT. "
+            f"Output only a number.\n\n"
+            f"CONTEXT:\n{prepared[i][2]}\n\nANSWER:\n{prepared[i][0]}"
+            for i in graded
+        ]
+        try:
+            outputs = get_faithfulness_grader()(prompts, batch_size=batch_size)
+            for i, out in zip(graded, outputs):
+                out = out[0] if isinstance(out, list) else out
+                llm_vals[i] = _parse_llm_score(out["generated_text"])
+        except Exception:
+            llm_vals = {i: 0.5 for i in graded}
+
+    results = []
+    latency = round((time.time() - start) * 1000 / max(len(prepared), 1), 2)
+    for i, (item, (answer, ground_truth, context)) in enumerate(zip(items, prepared)):
+        relevant_ids = item.get("relevant_ids") or []
+        retrieved_ids = item.get("retrieved_ids") or []
+
+        faith = 0.0
+        if i in llm_vals:
+            combined = (0.4 * sim(slots[i], "answer", "context")) + (0.3 * rouge_l_score(answer, context)) \
+                + (0.2 * fuzzy_score(answer, context)) + (0.1 * llm_vals[i])
+            faith = float(min(max(combined, 0.0), 1.0))
+
+        results.append({
+            "Recall@5": round(recall_at_k(retrieved_ids, relevant_ids), 3),
+            "Precision@5": round(precision_at_k(retrieved_ids, relevant_ids), 3),
+            "Semantic Similarity": round(sim(slots[i], "answer", "ground_truth"), 3),
+            "Faithfulness": round(faith, 3),
+            "Latency(ms)": latency,
+        })
+    return results
+
+# -------------------------------------------------------------------
+# Metrics Logging (buffered, columnar; see metrics_sink.py)
 # -------------------------------------------------------------------
-def log_metrics(query, answer, metrics, csv_path="rag_metrics_log.csv"):
+def log_metrics(query, answer, metrics, sink=None):
     record = {
-        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "timestamp": time.time(),
         "query": query,
         "answer": answer,
         **metrics
     }
-    df = pd.DataFrame([record])
-    df.to_csv(csv_path, mode="a", index=False, header=not pd.io.common.file_exists(csv_path))
+    (sink or get_metrics_sink()).add(record)
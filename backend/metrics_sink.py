@@ -0,0 +1,194 @@
+import atexit
+import glob
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pyarrow as pa
+
+# ------------------------------------------------------------
+# CONFIGURATION
+# ------------------------------------------------------------
+METRICS_DIR = os.getenv("METRICS_DIR", "metrics_log")
+METRICS_FLUSH_ROWS = int(os.getenv("METRICS_FLUSH_ROWS", "256"))
+METRICS_FLUSH_S = float(os.getenv("METRICS_FLUSH_S", "10"))
+METRICS_ROTATE_ROWS = int(os.getenv("METRICS_ROTATE_ROWS", "100000"))
+METRICS_ROTATE_S = float(os.getenv("METRICS_ROTATE_S", "3600"))
+
+LATENCY_COLUMNS = ["Retrieval(ms)", "Generation(ms)", "Total(ms)"]
+SCORE_COLUMNS = ["Recall@5", "Precision@5", "Semantic Similarity", "Faithfulness", "Latency(ms)"]
+
+SCHEMA = pa.schema(
+    [("timestamp", pa.float64()), ("query", pa.string()), ("answer", pa.string())]
+    + [(name, pa.float64()) for name in SCORE_COLUMNS + LATENCY_COLUMNS]
+)
+
+
+# ------------------------------------------------------------
+# WRITER
+# ------------------------------------------------------------
+class MetricsSink:
+    """
+    Buffers metric records in memory and appends them as Arrow IPC record
+    batches, flushing every `flush_rows` records or `flush_s` seconds.
+
+    Every process writes its own segment files (named by start time, pid and
+    a sequence number, and created exclusively), so concurrent workers never
+    share a file and a rotation never overwrites an earlier segment. Segments rotate by row count
+    and age.
+    """
+
+    def __init__(self, root: str = METRICS_DIR, flush_rows: int = METRICS_FLUSH_ROWS,
+                 flush_s: float = METRICS_FLUSH_S, rotate_rows: int = METRICS_ROTATE_ROWS,
+                 rotate_s: float = METRICS_ROTATE_S):
+        self.root = root
+        self.flush_rows = flush_rows
+        self.flush_s = flush_s
+        self.rotate_rows = rotate_rows
+        self.rotate_s = rotate_s
+        os.makedirs(root, exist_ok=True)
+
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._file = None
+        self._writer = None
+        self._segment_rows = 0
+        self._segment_started = 0.0
+        self._sequence = 0
+
+        self._timer = threading.Thread(target=self._flush_periodically, name="metrics-sink", daemon=True)
+        self._timer.start()
+        atexit.register(self.close)
+
+    def add(self, record: Dict[str, Any]):
+        with self._lock:
+            self._buffer.append(record)
+            if len(self._buffer) >= self.flush_rows:
+                self._flush_locked()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def close(self):
+        with self._lock:
+            self._flush_locked()
+            self._close_segment()
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(self.flush_s)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Metrics flush failed: {e}")
+
+    def _open_segment(self):
+        now = time.time()
+        stamp = datetime.fromtimestamp(now).strftime('%Y%m%dT%H%M%S')
+        while True:
+            self._sequence += 1
+            path = os.path.join(self.root, f"metrics-{stamp}-{os.getpid()}-{self._sequence:04d}.arrows")
+            try:
+                # Claim the name first: a restarted process may reuse the pid within the same second
+                open(path, "xb").close()
+                break
+            except FileExistsError:
+                continue
+        self._file = pa.OSFile(path, "wb")
+        self._writer = pa.ipc.new_stream(self._file, SCHEMA)
+        self._segment_rows = 0
+        self._segment_started = now
+
+    def _close_segment(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._file.close()
+            self._writer = self._file = None
+
+    def _flush_locked(self):
+        if not self._buffer:
+            return
+        rows, self._buffer = self._buffer, []
+
+        if self._writer is not None and (
+            self._segment_rows >= self.rotate_rows or time.time() - self._segment_started >= self.rotate_s
+        ):
+            self._close_segment()
+        if self._writer is None:
+            self._open_segment()
+
+        arrays = [pa.array([r.get(field.name) for r in rows], type=field.type) for field in SCHEMA]
+        self._writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=SCHEMA))
+        self._file.flush()
+        self._segment_rows += len(rows)
+
+
+_sink = None
+_sink_lock = threading.Lock()
+
+
+def get_metrics_sink() -> MetricsSink:
+    global _sink
+    if _sink is None:
+        with _sink_lock:
+            if _sink is None:
+                _sink = MetricsSink()
+    return _sink
+
+
+# ------------------------------------------------------------
+# READER
+# ------------------------------------------------------------
+def _read_column_window(path: str, column: str, since: float, until: float) -> List[np.ndarray]:
+    """Reads one column from a segment, memory-mapped, keeping rows inside the window."""
+    parts = []
+    try:
+        with pa.memory_map(path, "r") as source:
+            reader = pa.ipc.open_stream(source)
+            while True:
+                try:
+                    batch = reader.read_next_batch()
+                except StopIteration:
+                    break
+                ts = batch.column("timestamp").to_numpy(zero_copy_only=False)
+                mask = (ts >= since) & (ts <= until)
+                if mask.any():
+                    values = batch.column(column).to_numpy(zero_copy_only=False)[mask]
+                    parts.append(values[~np.isnan(values)])
+    except (pa.ArrowInvalid, OSError):
+        # A segment still being written may end in a partial batch
+        pass
+    return parts
+
+
+def latency_rollup(window_s: float = 3600, columns: Optional[List[str]] = None,
+                   root: str = METRICS_DIR, now: Optional[float] = None) -> Dict[str, Any]:
+    """
+    p50/p95/p99 of the latency columns over the last `window_s` seconds.
+
+    Segments last written before the window starts are skipped by mtime, so
+    only the relevant part of the history is touched.
+    """
+    until = now or time.time()
+    since = until - window_s
+    columns = columns or LATENCY_COLUMNS
+
+    paths = [p for p in sorted(glob.glob(os.path.join(root, "metrics-*.arrows")))
+             if os.path.getmtime(p) >= since]
+    result = {"window_s": window_s, "segments": len(paths)}
+    for column in columns:
+        parts = []
+        for path in paths:
+            parts.extend(_read_column_window(path, column, since, until))
+        values = np.concatenate(parts) if parts else np.array([])
+        if values.size:
+            p50, p95, p99 = np.percentile(values, [50, 95, 99])
+            result[column] = {"count": int(values.size), "p50": round(float(p50), 2),
+                              "p95": round(float(p95), 2), "p99": round(float(p99), 2)}
+        else:
+            result[column] = {"count": 0}
+    return result
@@ -0,0 +1,307 @@
+import json
+import os
+import queue
+import socket
+import socketserver
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# ------------------------------------------------------------
+# CONFIGURATION
+# ------------------------------------------------------------
+# Run `python model_server.py` once per host and set MODEL_SERVER_SOCKET in
+# every API worker; leave it unset to load the models in each process.
+MODEL_SERVER_SOCKET = os.getenv("MODEL_SERVER_SOCKET", "")
+MODEL_CLIENT_CONNECTIONS = int(os.getenv("MODEL_CLIENT_CONNECTIONS", "8"))
+MODEL_SERVER_TIMEOUT_S = float(os.getenv("MODEL_SERVER_TIMEOUT_S", "60"))
+
+_FRAME = struct.Struct("!IQ")  # header length, payload length
+_SERVING = False
+
+
+# ------------------------------------------------------------
+# WIRE PROTOCOL
+# ------------------------------------------------------------
+# Every message is a frame: a JSON header plus an optional raw payload.
+# Arrays travel as raw bytes described by the header's dtype and shape.
+def _recv_exact(sock: socket.socket, n: int) -> bytearray:
+    buf = bytearray(n)
+    view = memoryview(buf)
+    got = 0
+    while got < n:
+        read = sock.recv_into(view[got:], n - got)
+        if not read:
+            raise ConnectionError("model server connection closed")
+        got += read
+    return buf
+
+
+def send_frame(sock: socket.socket, header: Dict[str, Any], payload=b""):
+    head = json.dumps(header).encode()
+    size = payload.nbytes if isinstance(payload, np.ndarray) else len(payload)
+    sock.sendall(_FRAME.pack(len(head), size) + head)
+    if size:
+        sock.sendall(memoryview(payload).cast("B"))
+
+
+def recv_frame(sock: socket.socket) -> Tuple[Dict[str, Any], bytearray]:
+    head_len, payload_len = _FRAME.unpack(_recv_exact(sock, _FRAME.size))
+    header = json.loads(_recv_exact(sock, head_len))
+    return header, _recv_exact(sock, payload_len) if payload_len else bytearray()
+
+
+def _array_frame(arr: np.ndarray, **extra):
+    arr = np.ascontiguousarray(arr)
+    return {"dtype": arr.dtype.str, "shape": list(arr.shape), **extra}, arr
+
+
+def _frame_array(header: Dict[str, Any], payload: bytearray) -> np.ndarray:
+    """Views the received buffer as an array without copying it."""
+    return np.frombuffer(payload, dtype=np.dtype(header["dtype"])).reshape(header["shape"])
+
+
+# ------------------------------------------------------------
+# SERVER
+# ------------------------------------------------------------
+class _ModelHandler(socketserver.BaseRequestHandler):
+    """Serves one worker connection; requests on it are handled in order."""
+
+    def handle(self):
+        while True:
+            try:
+                header, payload = recv_frame(self.request)
+            except (ConnectionError, OSError):
+                return
+            try:
+                reply = self.server.dispatch(header, payload)
+            except Exception as e:
+                reply = ({"error": f"{type(e).__name__}: {e}"}, b"")
+            send_frame(self.request, *reply)
+
+
+class ModelServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Owns the query embedding model (MiniLM) and the evaluation models
+    (mpnet, flan-t5) for every API worker on the host.
+
+    Single-text encodes from all workers go through one EmbeddingEngine,
+    so they share micro-batches just as requests inside one process do.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, path: str):
+        if os.path.exists(path):
+            os.unlink(path)
+        super().__init__(path, _ModelHandler)
+
+    def dispatch(self, header: Dict[str, Any], payload: bytearray):
+        import metrics
+        from embedding import get_embedding_engine, EMBED_MODEL_NAME
+        from onnx_backend import model_variant
+
+        op = header["op"]
+        if op == "info":
+            model = get_embedding_engine().model
+            return {"model": EMBED_MODEL_NAME, "dim": model.get_sentence_embedding_dimension(),
+                    "max_seq_length": model.max_seq_length, "variant": model_variant(model)}, b""
+        if op == "encode":
+            texts = header["texts"]
+            if header.get("model") == "evaluation":
+                vecs = metrics.get_embedding_model().encode(
+                    texts, batch_size=header.get("batch_size") or 32, convert_to_numpy=True,
+                    normalize_embeddings=header.get("normalize", False), show_progress_bar=False)
+            elif len(texts) == 1:
+                vecs = get_embedding_engine().encode(texts[0])[None, :]
+            else:
+                vecs = get_embedding_engine().encode_batch(texts, header.get("batch_size"))
+            return _array_frame(np.asarray(vecs, dtype=np.float32))
+        if op == "tokenize":
+            enc = get_embedding_engine().model.tokenizer(
+                header["texts"], add_special_tokens=False, return_offsets_mapping=True,
+                return_attention_mask=False, return_token_type_ids=False)
+            starts = [[s for s, _ in offsets] for offsets in enc["offset_mapping"]]
+            flat = np.fromiter((s for row in starts for s in row), dtype=np.int64)
+            return _array_frame(flat, lengths=[len(row) for row in starts])
+        if op == "grade":
+            outputs = metrics.get_faithfulness_grader()(header["prompts"], batch_size=header.get("batch_size") or 8)
+            texts = [(out[0] if isinstance(out, list) else out)["generated_text"] for out in outputs]
+            return {"texts": texts}, b""
+        if op == "stats":
+            return {"embedding": get_embedding_engine().stats(), "evaluation_loaded": metrics.models_loaded()}, b""
+        raise ValueError(f"unknown op {op!r}")
+
+
+def serve(path: str = MODEL_SERVER_SOCKET or "/tmp/mrag-models.sock"):
+    """Loads every model once, then serves workers until interrupted."""
+    global _SERVING
+    _SERVING = True
+    import metrics
+    from embedding import get_embedding_engine
+
+    get_embedding_engine()
+    metrics.load_models()
+    server = ModelServer(path)
+    print(f"Model server listening on {path}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if os.path.exists(path):
+            os.unlink(path)
+
+
+# ------------------------------------------------------------
+# CLIENT
+# ------------------------------------------------------------
+class ModelClient:
+    """Pooled connections to the model server; `call` is safe from any thread."""
+
+    def __init__(self, path: str, connections: int = MODEL_CLIENT_CONNECTIONS,
+                 timeout_s: float = MODEL_SERVER_TIMEOUT_S):
+        self.path = path
+        self.timeout_s = timeout_s
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(connections)
+
+    def _connect(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout_s)
+        sock.connect(self.path)
+        return sock
+
+    def call(self, header: Dict[str, Any], payload=b"") -> Tuple[Dict[str, Any], bytearray]:
+        with self._slots:
+            try:
+                sock = self._idle.get_nowait()
+            except queue.Empty:
+                sock = self._connect()
+            try:
+                send_frame(sock, header, payload)
+                reply, data = recv_frame(sock)
+            except Exception:
+                sock.close()
+                raise
+            self._idle.put(sock)
+        if "error" in reply:
+            raise RuntimeError(f"model server: {reply['error']}")
+        return reply, data
+
+    def encode(self, texts: List[str], model: str = "embedding", **options) -> np.ndarray:
+        return _frame_array(*self.call({"op": "encode", "texts": list(texts), "model": model, **options}))
+
+
+class _RemoteTokenizer:
+    """Stands in for the MiniLM fast tokenizer inside TokenChunker."""
+
+    is_fast = True
+
+    def __init__(self, client: ModelClient):
+        self.client = client
+
+    def token_starts(self, texts: List[str]) -> List[np.ndarray]:
+        header, data = self.client.call({"op": "tokenize", "texts": list(texts)})
+        flat = _frame_array(header, data)
+        bounds = np.cumsum([0] + header["lengths"])
+        return [flat[a:b] for a, b in zip(bounds[:-1], bounds[1:])]
+
+
+class RemoteSentenceModel:
+    """The subset of the SentenceTransformer API the app and metrics use."""
+
+    def __init__(self, client: ModelClient, model: str, info: Optional[Dict[str, Any]] = None):
+        self.client = client
+        self.name = model
+        self.info = info or {}
+        self.max_seq_length = self.info.get("max_seq_length")
+        self.variant = self.info.get("variant", "torch")
+        self.tokenizer = _RemoteTokenizer(client) if model == "embedding" else None
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.info["dim"]
+
+    def encode(self, texts, batch_size: int = 32, convert_to_tensor: bool = False,
+               normalize_embeddings: bool = False, **_):
+        single = isinstance(texts, str)
+        vecs = self.client.encode([texts] if single else texts, model=self.name,
+                                  batch_size=batch_size, normalize=normalize_embeddings)
+        vecs = vecs[0] if single else vecs
+        if convert_to_tensor:
+            import torch
+            return torch.from_numpy(vecs)
+        return vecs
+
+
+class RemoteGrader:
+    """Callable like the flan-t5 text2text pipeline."""
+
+    def __init__(self, client: ModelClient):
+        self.client = client
+
+    def __call__(self, prompts, batch_size: int = 8, **_):
+        single = isinstance(prompts, str)
+        header, _ = self.client.call({"op": "grade", "prompts": [prompts] if single else list(prompts),
+                                      "batch_size": batch_size})
+        return [{"generated_text": text} for text in header["texts"]]
+
+
+class RemoteEmbeddingEngine:
+    """Same API as embedding.EmbeddingEngine, backed by the shared model server."""
+
+    def __init__(self, client: ModelClient):
+        self.client = client
+        self.model = RemoteSentenceModel(client, "embedding", client.call({"op": "info"})[0])
+        self._pool = ThreadPoolExecutor(max_workers=MODEL_CLIENT_CONNECTIONS, thread_name_prefix="model-client")
+
+    def submit(self, text: str):
+        return self._pool.submit(lambda: self.client.encode([text])[0])
+
+    def encode(self, text: str) -> np.ndarray:
+        return self.client.encode([text])[0]
+
+    async def aencode(self, text: str) -> np.ndarray:
+        import asyncio
+        return await asyncio.wrap_future(self.submit(text))
+
+    def encode_batch(self, texts: List[str], batch_size: Optional[int] = None) -> np.ndarray:
+        return self.client.encode(texts, batch_size=batch_size)
+
+    def stats(self):
+        return {"remote": self.client.path, **self.client.call({"op": "stats"})[0]["embedding"]}
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_model_client() -> Optional[ModelClient]:
+    """
+    The shared model server client, or None to load models in-process:
+    when MODEL_SERVER_SOCKET is unset, the server is unreachable, or this
+    process is the server.
+    """
+    global _client
+    if _SERVING or not MODEL_SERVER_SOCKET:
+        return None
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                client = ModelClient(MODEL_SERVER_SOCKET)
+                try:
+                    client.call({"op": "info"})
+                except Exception as e:
+                    print(f"Model server unavailable at {MODEL_SERVER_SOCKET} ({e}); loading models in-process")
+                    return None
+                _client = client
+    return _client
+
+
+if __name__ == "__main__":
+    # Serve from the importable module: metrics and embedding call
+    # model_server.get_model_client(), which must see _SERVING set
+    import model_server
+    model_server.serve()
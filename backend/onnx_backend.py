@@ -0,0 +1,245 @@
+import inspect
+import json
+import os
+import re
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# ------------------------------------------------------------
+# CONFIGURATION
+# ------------------------------------------------------------
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "torch")  # "torch" or "onnx"
+ONNX_QUANTIZE = os.getenv("ONNX_QUANTIZE", "1") == "1"
+ONNX_THREADS = int(os.getenv("ONNX_THREADS", "0"))  # 0 = onnxruntime default
+ONNX_CACHE_DIR = os.getenv("ONNX_CACHE_DIR", "onnx_models")
+ONNX_MIN_AGREEMENT = float(os.getenv("ONNX_MIN_AGREEMENT", "0.98"))
+
+# Sample used to compare ONNX embeddings with the PyTorch baseline
+AGREEMENT_TEXTS = [
+    "What was the license revenue in 1999?",
+    "The company covers an estimated 70% of the world market.",
+    "Revenue grew strongly from 1996 to 1999, led by licenses.",
+    "VISUAL CACHE: a bar chart of revenue by product line.",
+    "Sweden and the rest of Europe account for most license income.",
+    "Automatic data capture reduces costs and shortens entry times.",
+    "short",
+    "Tables and figures on page three summarise the service contracts, hardware sales and "
+    "distributor agreements for each region over the reporting period.",
+]
+
+
+def model_variant(model) -> str:
+    """Which runtime produced a model's embeddings ("torch", "onnx-fp32" or "onnx-int8")."""
+    return getattr(model, "variant", "torch")
+
+
+def _cosines(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    a = a / np.maximum(np.linalg.norm(a, axis=1, keepdims=True), 1e-12)
+    b = b / np.maximum(np.linalg.norm(b, axis=1, keepdims=True), 1e-12)
+    return (a * b).sum(axis=1)
+
+
+# ------------------------------------------------------------
+# ONNX RUNTIME ENCODER
+# ------------------------------------------------------------
+class OnnxSentenceEncoder:
+    """
+    Runs an exported sentence-transformer with ONNX Runtime on CPU.
+
+    Offers the parts of the SentenceTransformer API this backend uses
+    (encode, get_sentence_embedding_dimension, max_seq_length, tokenizer),
+    so it can stand in for the PyTorch model inside EmbeddingEngine and
+    metrics.py. Pooling and normalisation follow the original model.
+    """
+
+    def __init__(self, model_dir: str, threads: int = ONNX_THREADS, quantized: bool = ONNX_QUANTIZE):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        with open(os.path.join(model_dir, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.max_seq_length = self.meta["max_seq_length"]
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        path = os.path.join(model_dir, "model.int8.onnx" if quantized else "model.onnx")
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+        self.variant = "onnx-int8" if quantized else "onnx-fp32"
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.meta["dim"]
+
+    def _forward(self, texts: List[str]) -> np.ndarray:
+        enc = self.tokenizer(texts, padding=True, truncation=True, max_length=self.max_seq_length,
+                             return_tensors="np")
+        feeds = {name: enc[name].astype(np.int64) for name in self.input_names}
+        hidden = self.session.run(None, feeds)[0]
+        mask = enc["attention_mask"][..., None].astype(np.float32)
+        if self.meta["pooling"] == "cls":
+            pooled = hidden[:, 0]
+        else:
+            pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        if self.meta["normalize"]:
+            pooled = pooled / np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+        return pooled.astype(np.float32)
+
+    def encode(self, sentences, batch_size: int = 32, convert_to_numpy: bool = True,
+               convert_to_tensor: bool = False, normalize_embeddings: bool = False,
+               show_progress_bar: bool = False, **_):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        out = np.zeros((len(texts), self.meta["dim"]), dtype=np.float32)
+        # Length-sorted batches keep padding low, as SentenceTransformer does
+        order = np.argsort([-len(t) for t in texts], kind="stable")
+        for i in range(0, len(texts), batch_size):
+            idx = order[i:i + batch_size]
+            out[idx] = self._forward([texts[j] for j in idx])
+        if normalize_embeddings:
+            out /= np.maximum(np.linalg.norm(out, axis=1, keepdims=True), 1e-12)
+        out = out[0] if single else out
+        if convert_to_tensor:
+            import torch
+            return torch.from_numpy(out)
+        return out
+
+
+# ------------------------------------------------------------
+# EXPORT
+# ------------------------------------------------------------
+def _model_dir(model_name: str, cache_dir: str = ONNX_CACHE_DIR) -> str:
+    return os.path.join(cache_dir, re.sub(r"[^\w.-]", "_", model_name))
+
+
+def export_model(st_model, model_dir: str):
+    """Exports a SentenceTransformer's transformer to ONNX plus a dynamic int8 copy."""
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from sentence_transformers.models import Normalize, Pooling
+
+    os.makedirs(model_dir, exist_ok=True)
+    transformer = st_model[0]
+    tokenizer = transformer.tokenizer
+    names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in tokenizer.model_input_names]
+
+    class _Wrapper(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, *tensors):
+            return self.model(**dict(zip(names, tensors))).last_hidden_state
+
+    sample = tokenizer(["export sample text"], return_tensors="pt")
+    axes = {n: {0: "batch", 1: "seq"} for n in names}
+    axes["last_hidden_state"] = {0: "batch", 1: "seq"}
+    wrapper = _Wrapper(transformer.auto_model).eval()
+    # torch >= 2.9 defaults to the dynamo exporter; dynamic_axes needs the TorchScript one
+    legacy = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+    with torch.no_grad():
+        torch.onnx.export(wrapper, tuple(sample[n] for n in names), os.path.join(model_dir, "model.onnx"),
+                          input_names=names, output_names=["last_hidden_state"], dynamic_axes=axes,
+                          opset_version=14, do_constant_folding=True, **legacy)
+    quantize_dynamic(os.path.join(model_dir, "model.onnx"), os.path.join(model_dir, "model.int8.onnx"),
+                     weight_type=QuantType.QInt8)
+
+    pooling = next((m for m in st_model if isinstance(m, Pooling)), None)
+    # sentence-transformers < 6 has pooling_mode_cls_token, later versions pooling_mode
+    pooling_config = pooling.get_config_dict() if pooling is not None else {}
+    cls_pooling = pooling_config.get("pooling_mode") == "cls" or pooling_config.get("pooling_mode_cls_token", False)
+    tokenizer.save_pretrained(model_dir)
+    with open(os.path.join(model_dir, "meta.json"), "w") as f:
+        json.dump({
+            "dim": st_model.get_sentence_embedding_dimension(),
+            "max_seq_length": st_model.max_seq_length,
+            "pooling": "cls" if cls_pooling else "mean",
+            "normalize": any(isinstance(m, Normalize) for m in st_model),
+        }, f)
+
+
+def agreement(baseline, candidate, texts: Optional[List[str]] = None) -> Dict[str, float]:
+    """Cosine agreement between two encoders' embeddings of the same texts."""
+    texts = texts or AGREEMENT_TEXTS
+    cos = _cosines(np.asarray(baseline.encode(texts, convert_to_numpy=True)),
+                   np.asarray(candidate.encode(texts, convert_to_numpy=True)))
+    return {"mean_cosine": round(float(cos.mean()), 5), "min_cosine": round(float(cos.min()), 5)}
+
+
+def load_sentence_model(model_name: str, backend: str = EMBED_BACKEND):
+    """
+    Loads `model_name` with PyTorch, or with ONNX Runtime when backend is
+    "onnx". The first ONNX load exports the model and checks its agreement
+    with PyTorch; below ONNX_MIN_AGREEMENT it keeps the PyTorch model.
+    """
+    from sentence_transformers import SentenceTransformer
+
+    if backend != "onnx":
+        return SentenceTransformer(model_name)
+
+    model_dir = _model_dir(model_name)
+    if os.path.exists(os.path.join(model_dir, "meta.json")):
+        return OnnxSentenceEncoder(model_dir)
+
+    baseline = SentenceTransformer(model_name)
+    try:
+        export_model(baseline, model_dir)
+        encoder = OnnxSentenceEncoder(model_dir)
+    except Exception as e:
+        print(f"ONNX export of {model_name} failed ({e}); using PyTorch")
+        return baseline
+    check = agreement(baseline, encoder)
+    print(f"ONNX {model_name} agreement with PyTorch: {check}")
+    if check["min_cosine"] < ONNX_MIN_AGREEMENT:
+        print(f"ONNX agreement below {ONNX_MIN_AGREEMENT}; using PyTorch")
+        os.remove(os.path.join(model_dir, "meta.json"))
+        return baseline
+    return encoder
+
+
+# ------------------------------------------------------------
+# BENCHMARK
+# ------------------------------------------------------------
+def benchmark(model_name: str, n_texts: int = 512, batch_size: int = 32, repeats: int = 3):
+    """Encode throughput (texts/s) of PyTorch vs ONNX fp32 vs ONNX int8, with agreement."""
+    from sentence_transformers import SentenceTransformer
+
+    rng = np.random.RandomState(0)
+    words = " ".join(AGREEMENT_TEXTS).split()
+    texts = [" ".join(rng.choice(words, size=rng.randint(8, 120))) for _ in range(n_texts)]
+
+    baseline = SentenceTransformer(model_name)
+    model_dir = _model_dir(model_name)
+    if not os.path.exists(os.path.join(model_dir, "meta.json")):
+        export_model(baseline, model_dir)
+    encoders = {
+        "torch": baseline,
+        "onnx-fp32": OnnxSentenceEncoder(model_dir, quantized=False),
+        "onnx-int8": OnnxSentenceEncoder(model_dir, quantized=True),
+    }
+
+    results = {}
+    for name, model in encoders.items():
+        model.encode(texts[:batch_size], batch_size=batch_size)  # warm-up
+        best = float("inf")
+        for _ in range(repeats):
+            start = time.perf_counter()
+            model.encode(texts, batch_size=batch_size)
+            best = min(best, time.perf_counter() - start)
+        results[name] = {"texts_per_s": round(n_texts / best, 1)}
+        if name != "torch":
+            results[name].update(agreement(baseline, model, texts[:64]))
+    return results
+
+
+if __name__ == "__main__":
+    import sys
+
+    for name in sys.argv[1:] or ["all-MiniLM-L6-v2"]:
+        print(name)
+        for backend, row in benchmark(name).items():
+            print(f"  {backend:10s} {row}")
@@ -0,0 +1,241 @@
+import hashlib
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import List, Dict, Any, Iterator, Tuple, Optional
+
+import fitz  # PyMuPDF
+from PIL import Image
+import pytesseract
+
+# ------------------------------------------------------------
+# CONFIGURATION
+# ------------------------------------------------------------
+TESSERACT_CMD = os.getenv("TESSERACT_CMD", r"C:\Program Files\Tesseract-OCR\tesseract.exe")
+OCR_LANG = os.getenv("OCR_LANG", "eng")
+RENDER_DPI = int(os.getenv("RENDER_DPI", "150"))
+PAGE_WORKERS = int(os.getenv("PAGE_WORKERS", "0")) or (os.cpu_count() or 1)
+PAGES_PER_TASK = int(os.getenv("PAGES_PER_TASK", "4"))
+# Forking the threaded API process can copy held locks into workers; forkserver is not available on Windows
+PAGE_POOL_START = os.getenv("PAGE_POOL_START") or \
+    ("forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
+
+# Adaptive OCR policy ("adaptive" or "always")
+OCR_POLICY = os.getenv("OCR_POLICY", "adaptive")
+OCR_MIN_CHARS = int(os.getenv("OCR_MIN_CHARS", "200"))
+OCR_MIN_TEXT_COVERAGE = float(os.getenv("OCR_MIN_TEXT_COVERAGE", "0.05"))
+OCR_PARTIAL_IMAGE_FRACTION = float(os.getenv("OCR_PARTIAL_IMAGE_FRACTION", "0.10"))
+OCR_MIN_REGION_FRACTION = float(os.getenv("OCR_MIN_REGION_FRACTION", "0.02"))
+
+pytesseract.pytesseract.tesseract_cmd = TESSERACT_CMD
+
+
+# ------------------------------------------------------------
+# RENDERING
+# ------------------------------------------------------------
+def pixmap_to_image(pix) -> Image.Image:
+    """Wraps raw pixmap samples in a PIL image without a PNG round trip."""
+    mode = "L" if pix.n == 1 else "RGB"
+    return Image.frombytes(mode, (pix.width, pix.height), pix.samples)
+
+
+def render_page(page, dpi: int = RENDER_DPI, gray: bool = False) -> Image.Image:
+    """Renders a PyMuPDF page straight to an in-memory PIL image."""
+    colorspace = fitz.csGRAY if gray else fitz.csRGB
+    return pixmap_to_image(page.get_pixmap(dpi=dpi, colorspace=colorspace, alpha=False))
+
+
+def iter_page_images(pdf_path: str, dpi: int = RENDER_DPI,
+                     page_numbers: Optional[List[int]] = None) -> Iterator[Tuple[int, Image.Image]]:
+    """Yields (page_num, RGB image) one page at a time."""
+    with fitz.open(pdf_path) as doc:
+        numbers = range(doc.page_count) if page_numbers is None else page_numbers
+        for i in numbers:
+            yield i, render_page(doc[i], dpi)
+
+
+def page_digest(doc, page) -> str:
+    """
+    Hashes what a page is drawn from: its size, content streams and the raw
+    streams of the images and form XObjects it references. No rendering needed.
+    """
+    h = hashlib.sha256()
+    h.update(repr(tuple(page.rect)).encode())
+    h.update(page.read_contents())
+    for img in page.get_images(full=True):
+        h.update(doc.xref_stream_raw(img[0]) or b"")
+    for xobj in page.get_xobjects():
+        h.update(doc.xref_stream_raw(xobj[0]) or b"")
+    return h.hexdigest()
+
+
+def page_count(pdf_path: str) -> int:
+    with fitz.open(pdf_path) as doc:
+        return doc.page_count
+
+
+def page_hashes(pdf_path: str) -> List[str]:
+    """Content hash of every page, in page order."""
+    with fitz.open(pdf_path) as doc:
+        return [page_digest(doc, page) for page in doc]
+
+
+# ------------------------------------------------------------
+# OCR POLICY
+# ------------------------------------------------------------
+def _area(rect) -> float:
+    return max(0.0, rect.width) * max(0.0, rect.height)
+
+
+def ocr_policy(page, text: str, policy: str = OCR_POLICY) -> Dict[str, Any]:
+    """
+    Decides from the text layer whether a page needs OCR.
+
+    Returns a dict with `mode` ("full", "partial" or "skip"), the inputs
+    used (character count, text coverage, image fraction) and, for partial
+    pages, the image regions to OCR.
+    """
+    page_rect = page.rect
+    page_area = _area(page_rect) or 1.0
+    chars = len(text.strip())
+
+    text_area = 0.0
+    for x0, y0, x1, y1, _, _, block_type in page.get_text("blocks"):
+        if block_type == 0:
+            text_area += _area(fitz.Rect(x0, y0, x1, y1) & page_rect)
+
+    regions, image_area = [], 0.0
+    for info in page.get_image_info():
+        rect = fitz.Rect(info["bbox"]) & page_rect
+        area = _area(rect)
+        image_area += area
+        if area / page_area >= OCR_MIN_REGION_FRACTION:
+            regions.append(rect)
+
+    decision = {
+        "chars": chars,
+        "text_coverage": round(min(text_area / page_area, 1.0), 4),
+        "image_fraction": round(min(image_area / page_area, 1.0), 4),
+        "regions": [],
+    }
+
+    if policy == "always" or chars < OCR_MIN_CHARS or decision["text_coverage"] < OCR_MIN_TEXT_COVERAGE:
+        decision["mode"] = "full"
+    elif regions and decision["image_fraction"] >= OCR_PARTIAL_IMAGE_FRACTION:
+        decision["mode"] = "partial"
+        decision["regions"] = regions
+    else:
+        decision["mode"] = "skip"
+    return decision
+
+
+def summarize_ocr(pages: List[Dict[str, Any]]) -> Dict[str, int]:
+    """Counts pages by OCR mode for ingest reporting."""
+    summary = {"ocr": 0, "partial": 0, "skipped": 0}
+    for p in pages:
+        key = {"full": "ocr", "partial": "partial"}.get(p.get("ocr_mode"), "skipped")
+        summary[key] += 1
+    return summary
+
+
+# ------------------------------------------------------------
+# WORKER PROCESS
+# ------------------------------------------------------------
+def _init_worker(tesseract_cmd: str):
+    # One Tesseract thread per process; the pool already fills the cores.
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+    pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+
+
+def ocr_image(img: Image.Image, lang: str = OCR_LANG) -> str:
+    try:
+        return pytesseract.image_to_string(img, lang=lang)
+    except Exception:
+        return ""
+
+
+def _ocr_page(page, decision: Dict[str, Any], dpi: int, lang: str) -> str:
+    if decision["mode"] == "full":
+        return ocr_image(render_page(page, dpi, gray=True), lang)
+    if decision["mode"] == "partial":
+        texts = []
+        for rect in decision["regions"]:
+            pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY, alpha=False, clip=rect)
+            texts.append(ocr_image(pixmap_to_image(pix), lang))
+        return "\n".join(t for t in texts if t.strip())
+    return ""
+
+
+def _process_batch(pdf_path: str, page_numbers: List[int], dpi: int, lang: str,
+                   policy: str) -> List[Dict[str, Any]]:
+    """Extracts the text layer and, where the policy asks for it, OCR text for the given pages."""
+    results = []
+    with fitz.open(pdf_path) as doc:
+        for i in page_numbers:
+            page = doc[i]
+            text = page.get_text()
+            decision = ocr_policy(page, text, policy)
+            results.append({
+                "page": i,
+                "text": text,
+                "ocr_text": _ocr_page(page, decision, dpi, lang),
+                "ocr_mode": decision["mode"],
+            })
+    return results
+
+
+# ------------------------------------------------------------
+# PAGE ENGINE
+# ------------------------------------------------------------
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_page_pool() -> ProcessPoolExecutor:
+    """Process pool sized to the available cores, created on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(
+                    max_workers=PAGE_WORKERS,
+                    mp_context=multiprocessing.get_context(PAGE_POOL_START),
+                    initializer=_init_worker,
+                    initargs=(TESSERACT_CMD,),
+                )
+    return _pool
+
+
+def submit_pages(pdf_path: str, page_numbers: List[int], dpi: int = RENDER_DPI, lang: str = OCR_LANG,
+                 pages_per_task: int = PAGES_PER_TASK, policy: str = OCR_POLICY) -> List[Future]:
+    """
+    Queues `page_numbers` on the process pool in batches of `pages_per_task`,
+    so each worker opens the document once per batch. Each future resolves
+    to that batch's page results in page order.
+    """
+    page_numbers = sorted(page_numbers)
+    pool = get_page_pool()
+    return [pool.submit(_process_batch, pdf_path, page_numbers[start:start + pages_per_task], dpi, lang, policy)
+            for start in range(0, len(page_numbers), pages_per_task)]
+
+
+def process_pages(pdf_path: str, dpi: int = RENDER_DPI, lang: str = OCR_LANG,
+                  pages_per_task: int = PAGES_PER_TASK, policy: str = OCR_POLICY,
+                  page_numbers: Optional[List[int]] = None) -> List[Dict[str, Any]]:
+    """
+    Renders and OCRs the pages of a PDF in the process pool.
+
+    Each page is run through `ocr_policy`, so pages with a usable text layer
+    skip Tesseract and mixed pages only OCR their image regions.
+
+    Pages (all, or just `page_numbers`) are handed out in small batches
+    (see `submit_pages`). Results come back in page order.
+    """
+    if page_numbers is None:
+        page_numbers = list(range(page_count(pdf_path)))
+
+    results = []
+    for fut in submit_pages(pdf_path, page_numbers, dpi, lang, pages_per_task, policy):
+        results.extend(fut.result())
+    return results
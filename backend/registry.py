@@ -0,0 +1,90 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterator, Optional
+
+# ------------------------------------------------------------
+# CONFIGURATION
+# ------------------------------------------------------------
+REGISTRY_PATH = os.getenv("REGISTRY_PATH", "doc_registry.sqlite3")
+
+
+# ------------------------------------------------------------
+# DOCUMENT REGISTRY
+# ------------------------------------------------------------
+class DocumentRegistry:
+    """
+    Persistent doc_id -> document info mapping backed by SQLite.
+
+    Behaves like the dict it replaces: rows are rehydrated into memory at
+    startup, reads are served from memory and every write goes through to
+    disk, so a restart keeps every ingested document searchable.
+
+    Other API worker processes write to the same file, so each read first
+    checks SQLite's data_version and reloads the rows after a commit from
+    another connection.
+    """
+
+    def __init__(self, path: str = REGISTRY_PATH):
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            " doc_id TEXT PRIMARY KEY, filename TEXT NOT NULL, collection TEXT NOT NULL,"
+            " info TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._db.commit()
+        self._lock = threading.Lock()
+        self._version = None
+        self._docs = {}
+        self._refresh()
+
+    def _refresh(self) -> Dict[str, Dict[str, Any]]:
+        """The in-memory rows, reloaded first if another process has committed since the last read."""
+        with self._lock:
+            version = self._db.execute("PRAGMA data_version").fetchone()[0]
+            if version != self._version:
+                self._version = version
+                self._docs = {
+                    doc_id: {**json.loads(info), "filename": filename, "collection": collection}
+                    for doc_id, filename, collection, info in self._db.execute(
+                        "SELECT doc_id, filename, collection, info FROM documents ORDER BY created_at")
+                }
+            return self._docs
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._refresh()
+
+    def __getitem__(self, doc_id: str) -> Dict[str, Any]:
+        return self._refresh()[doc_id]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._refresh()))
+
+    def __len__(self) -> int:
+        return len(self._refresh())
+
+    def get(self, doc_id: str, default: Optional[Dict[str, Any]] = None):
+        return self._refresh().get(doc_id, default)
+
+    def items(self):
+        return list(self._refresh().items())
+
+    def __setitem__(self, doc_id: str, info: Dict[str, Any]):
+        extra = {k: v for k, v in info.items() if k not in ("filename", "collection")}
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO documents (doc_id, filename, collection, info, created_at)"
+                " VALUES (?, ?, ?, ?, COALESCE((SELECT created_at FROM documents WHERE doc_id = ?), ?))",
+                (doc_id, info["filename"], info["collection"], json.dumps(extra), doc_id, time.time()),
+            )
+            self._db.commit()
+            self._docs[doc_id] = dict(info)
+
+    def __delitem__(self, doc_id: str):
+        with self._lock:
+            self._db.execute("DELETE FROM documents WHERE doc_id = ?", (doc_id,))
+            self._db.commit()
+            self._docs.pop(doc_id, None)
@@ -0,0 +1,57 @@
+import asyncio
+import threading
+
+import numpy as np
+
+from embedding import EmbeddingEngine
+
+
+class GatedModel:
+    """Encodes texts as [len(text)], blocking each batch until `gate` is set."""
+
+    def __init__(self):
+        self.gate = threading.Event()
+        self.started = threading.Event()
+        self.batches = []
+
+    def encode(self, texts, **_):
+        self.batches.append(list(texts))
+        self.started.set()
+        self.gate.wait(5)
+        return np.array([[float(len(t))] for t in texts], dtype=np.float32)
+
+
+def test_cancelled_caller_does_not_stop_the_worker():
+    model = GatedModel()
+    engine = EmbeddingEngine(model, max_batch_size=8, max_wait_ms=0)
+
+    async def scenario():
+        # The first encode holds the worker, so the second waits in the queue
+        first = asyncio.ensure_future(engine.aencode("first"))
+        await asyncio.get_running_loop().run_in_executor(None, model.started.wait, 5)
+        second = asyncio.ensure_future(engine.aencode("second"))
+        await asyncio.sleep(0.01)
+        second.cancel()
+        await asyncio.sleep(0.01)
+        model.gate.set()
+        return await asyncio.wait_for(first, 5), second.cancelled()
+
+    first, cancelled = asyncio.run(scenario())
+    assert first[0] == 5.0 and cancelled
+
+    assert engine.submit("again").result(timeout=5)[0] == 5.0
+    assert engine._worker.is_alive()
+    # The cancelled text was never encoded
+    assert ["second"] not in model.batches
+
+
+def test_encode_errors_reach_every_caller():
+    class Broken:
+        def encode(self, texts, **_):
+            raise RuntimeError("model failed")
+
+    engine = EmbeddingEngine(Broken(), max_wait_ms=0)
+    futures = [engine.submit(t) for t in ("a", "b")]
+    for fut in futures:
+        assert isinstance(fut.exception(timeout=5), RuntimeError)
+    assert engine._worker.is_alive()
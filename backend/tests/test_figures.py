@@ -0,0 +1,187 @@
+import pytest
+from PIL import Image, ImageDraw
+
+import figures
+from figures import FigureExtractor, RateLimiter, StubFigureModel, TokenBucket, looks_like_figure
+
+
+class ResourceExhausted(Exception):
+    """Same name as the google.api_core quota error."""
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(figures.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(figures.time, "sleep", clock.sleep)
+    return clock
+
+
+def make_extractor(model, **kwargs):
+    kwargs.setdefault("prefilter", False)
+    return FigureExtractor(model, limiter=RateLimiter(rpm=1e9, tpm=1e12), **kwargs)
+
+
+def blank_page():
+    return Image.new("RGB", (200, 260), "white")
+
+
+# ------------------------------------------------------------
+# RATE LIMITING
+# ------------------------------------------------------------
+def test_token_bucket_is_free_within_capacity(clock):
+    bucket = TokenBucket(rate_per_minute=60, capacity=3)
+    assert [bucket.reserve(1) for _ in range(3)] == [0.0, 0.0, 0.0]
+
+
+def test_token_bucket_waits_for_the_deficit(clock):
+    bucket = TokenBucket(rate_per_minute=60, capacity=3)
+    for _ in range(3):
+        bucket.reserve(1)
+    # 1 token/s: the 4th and 5th tokens arrive after 1s and 2s
+    assert bucket.reserve(1) == pytest.approx(1.0)
+    assert bucket.reserve(1) == pytest.approx(2.0)
+
+
+def test_token_bucket_refills_over_time(clock):
+    bucket = TokenBucket(rate_per_minute=60, capacity=3)
+    for _ in range(3):
+        bucket.reserve(1)
+    clock.now += 2.0
+    assert bucket.reserve(2) == 0.0
+    assert bucket.reserve(1) == pytest.approx(1.0)
+
+
+def test_rate_limiter_sleeps_for_the_tighter_limit(clock):
+    limiter = RateLimiter(rpm=60, tpm=600)
+    limiter.acquire(tokens=600)
+    assert clock.sleeps == []
+    # Requests allow another call at once; tokens need 300/10 per second = 30s
+    limiter.acquire(tokens=300)
+    assert clock.sleeps == [pytest.approx(30.0)]
+
+
+# ------------------------------------------------------------
+# RETRIES
+# ------------------------------------------------------------
+@pytest.mark.parametrize("error", [
+    ResourceExhausted("exhausted"),
+    RuntimeError("429 Too Many Requests"),
+    RuntimeError("Quota exceeded for metric"),
+])
+def test_throttling_errors_are_retried(clock, error):
+    model = StubFigureModel(responses=[error, error], reply="A bar chart of sales by year.")
+    extractor = make_extractor(model)
+    assert extractor.describe(3, blank_page()) == "A bar chart of sales by year."
+    assert len(model.calls) == 3
+    assert extractor.stats["retries"] == 2
+    assert extractor.failed_pages == set()
+    assert len(clock.sleeps) == 2
+
+
+class ApiError(Exception):
+    def __init__(self, message, code):
+        super().__init__(message)
+        self.code = code
+
+
+@pytest.mark.parametrize("error, throttled", [
+    (ApiError("slow down", 429), True),
+    (ResourceExhausted("exhausted"), True),
+    (RuntimeError("Quota exceeded for metric generate_content_requests"), True),
+    (RuntimeError("You exceeded your current quota"), True),
+    (RuntimeError("rate limited, retry later"), True),
+    (ApiError("request 429 failed", 400), False),
+    (ValueError("image of 14290 bytes on page 429 is invalid"), False),
+    (RuntimeError("request id 8f429a1 failed"), False),
+])
+def test_is_throttle_error(error, throttled):
+    assert figures.is_throttle_error(error) is throttled
+
+
+def test_other_errors_mark_the_page_failed_without_retrying(clock):
+    model = StubFigureModel(responses=[ValueError("invalid image")], reply="A chart.")
+    extractor = make_extractor(model)
+    assert extractor.describe(7, blank_page()) is None
+    assert len(model.calls) == 1
+    assert extractor.stats["retries"] == 0
+    assert extractor.stats["errors"] == 1
+    assert extractor.failed_pages == {7}
+
+
+def test_throttling_gives_up_after_max_retries(clock):
+    model = StubFigureModel(reply=lambda parts: (_ for _ in ()).throw(ResourceExhausted("exhausted")))
+    extractor = make_extractor(model, max_retries=2)
+    assert extractor.describe(1, blank_page()) is None
+    assert len(model.calls) == 3
+    assert extractor.failed_pages == {1}
+
+
+def test_extract_keeps_figures_and_skips_failures(clock):
+    replies = {1: figures.NO_FIGURE, 2: "Flow diagram of the pipeline.", 3: ValueError("blocked")}
+
+    def reply(parts):
+        page = int(parts[0].split("Page ")[1].split()[0])
+        if isinstance(replies[page], Exception):
+            raise replies[page]
+        return replies[page]
+
+    extractor = make_extractor(StubFigureModel(reply=reply))
+    graph = extractor.extract((n, blank_page()) for n in (1, 2, 3))
+    assert graph == {"Page 2": "Flow diagram of the pipeline."}
+    assert extractor.failed_pages == {3}
+
+
+# ------------------------------------------------------------
+# LOCAL CHART PRE-FILTER
+# ------------------------------------------------------------
+def text_page():
+    img = blank_page().resize((850, 1100))
+    draw = ImageDraw.Draw(img)
+    for y in range(80, 1020, 22):
+        draw.text((70, y), "The quick brown fox jumps over the lazy dog, again and again.", fill="black")
+    return img
+
+
+def bar_chart():
+    img = blank_page().resize((850, 1100))
+    draw = ImageDraw.Draw(img)
+    draw.line([(100, 150), (100, 900)], fill="black", width=4)
+    draw.line([(100, 900), (780, 900)], fill="black", width=4)
+    for i, (height, color) in enumerate([(500, "steelblue"), (650, "darkorange"), (300, "seagreen")]):
+        x = 160 + i * 200
+        draw.rectangle([x, 900 - height, x + 120, 900], fill=color)
+    return img
+
+
+def test_text_page_is_not_a_figure():
+    assert not looks_like_figure(text_page())
+
+
+def test_blank_page_is_not_a_figure():
+    assert not looks_like_figure(blank_page())
+
+
+def test_chart_is_a_figure():
+    assert looks_like_figure(bar_chart())
+
+
+def test_prefiltered_pages_never_reach_the_model(clock):
+    model = StubFigureModel(reply="A bar chart.")
+    extractor = make_extractor(model, prefilter=True)
+    graph = extractor.extract([(1, text_page()), (2, bar_chart())])
+    assert graph == {"Page 2": "A bar chart."}
+    assert len(model.calls) == 1
+    assert extractor.stats["prefiltered"] == 1
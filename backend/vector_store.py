@@ -0,0 +1,652 @@
+import copy
+import json
+import os
+import shutil
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+try:
+    import hnswlib
+    HNSW_AVAILABLE = True
+except Exception:
+    HNSW_AVAILABLE = False
+
+# ------------------------------------------------------------
+# CONFIGURATION
+# ------------------------------------------------------------
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "qdrant")  # "qdrant" or "local"
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", "vector_index")
+LOCAL_HNSW_MIN = int(os.getenv("LOCAL_HNSW_MIN", "50000"))  # 0 disables HNSW
+HNSW_M = int(os.getenv("HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "200"))
+HNSW_EF = int(os.getenv("HNSW_EF", "64"))
+
+# Compact first-pass vectors: "none", "int8" (4x smaller) or "binary" (32x smaller).
+# Candidates are oversampled and rescored against the full-precision vectors.
+VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION", "none")
+QUANT_OVERSAMPLE = float(os.getenv("QUANT_OVERSAMPLE", "0"))  # 0 = per-mode default below
+DEFAULT_OVERSAMPLE = {"int8": 4.0, "binary": 40.0}
+QUANT_BLOCK_ROWS = 8192
+
+
+class SearchHit:
+    """One search result; mirrors the fields of a Qdrant ScoredPoint that callers use."""
+    __slots__ = ("id", "score", "payload")
+
+    def __init__(self, id, score: float, payload: Dict[str, Any]):
+        self.id, self.score, self.payload = id, score, payload
+
+
+# ------------------------------------------------------------
+# INTERFACE
+# ------------------------------------------------------------
+class VectorStore:
+    """Minimal vector index interface used by ingestion and retrieval."""
+
+    def collection_exists(self, name: str) -> bool:
+        raise NotImplementedError
+
+    def create_collection(self, name: str, dim: int):
+        raise NotImplementedError
+
+    def delete_collection(self, name: str):
+        raise NotImplementedError
+
+    def upsert(self, name: str, ids: Sequence[int], vectors: np.ndarray, payloads: Sequence[Dict[str, Any]]):
+        raise NotImplementedError
+
+    def delete_document(self, name: str, doc_id: str):
+        """Deletes every point whose payload doc_id matches, e.g. a failed ingest in a shared collection."""
+        raise NotImplementedError
+
+    def create_payload_index(self, name: str, field: str):
+        raise NotImplementedError
+
+    def search(self, name: str, vector: np.ndarray, limit: int = 5,
+               doc_ids: Optional[Sequence[str]] = None) -> List[SearchHit]:
+        """Top-`limit` hits; `doc_ids` restricts results to chunks whose payload doc_id matches."""
+        raise NotImplementedError
+
+    def search_batch(self, name: str, vectors: np.ndarray, limit: int = 5,
+                     doc_ids: Optional[Sequence[Optional[Sequence[str]]]] = None) -> List[List[SearchHit]]:
+        """One result list per query vector; `doc_ids` holds an optional filter per query."""
+        doc_ids = doc_ids or [None] * len(vectors)
+        return [self.search(name, v, limit, d) for v, d in zip(vectors, doc_ids)]
+
+
+# ------------------------------------------------------------
+# QDRANT
+# ------------------------------------------------------------
+class QdrantVectorStore(VectorStore):
+    """Qdrant service backend, sharing one client per process."""
+
+    def __init__(self, url: str, api_key: Optional[str] = None, timeout: float = 60.0,
+                 quantization: str = VECTOR_QUANTIZATION):
+        from qdrant_client import QdrantClient
+        self.client = QdrantClient(url=url, api_key=api_key, timeout=timeout)
+        self.quantization = quantization
+
+    def collection_exists(self, name: str) -> bool:
+        return self.client.collection_exists(name)
+
+    def create_collection(self, name: str, dim: int):
+        from qdrant_client import models
+        quantization_config = None
+        if self.quantization == "int8":
+            quantization_config = models.ScalarQuantization(scalar=models.ScalarQuantizationConfig(
+                type=models.ScalarType.INT8, quantile=0.99, always_ram=True))
+        elif self.quantization == "binary":
+            quantization_config = models.BinaryQuantization(binary=models.BinaryQuantizationConfig(always_ram=True))
+        self.client.create_collection(
+            collection_name=name,
+            # Full-precision vectors stay on disk when a quantized copy serves the first pass
+            vectors_config=models.VectorParams(size=dim, distance=models.Distance.COSINE,
+                                               on_disk=quantization_config is not None),
+            quantization_config=quantization_config,
+        )
+
+    def _search_params(self):
+        if self.quantization not in DEFAULT_OVERSAMPLE:
+            return None
+        from qdrant_client import models
+        return models.SearchParams(quantization=models.QuantizationSearchParams(
+            rescore=True, oversampling=QUANT_OVERSAMPLE or DEFAULT_OVERSAMPLE[self.quantization]))
+
+    def delete_collection(self, name: str):
+        self.client.delete_collection(name)
+
+    def delete_document(self, name: str, doc_id: str):
+        from qdrant_client.models import Filter, FieldCondition, FilterSelector, MatchValue
+        self.client.delete(collection_name=name, wait=True, points_selector=FilterSelector(
+            filter=Filter(must=[FieldCondition(key="doc_id", match=MatchValue(value=doc_id))])))
+
+    def create_payload_index(self, name: str, field: str):
+        from qdrant_client.models import PayloadSchemaType
+        self.client.create_payload_index(collection_name=name, field_name=field,
+                                         field_schema=PayloadSchemaType.KEYWORD)
+
+    def upsert(self, name, ids, vectors, payloads):
+        # upload_collection takes the float32 buffer as-is instead of per-point Python lists
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        self.client.upload_collection(collection_name=name, vectors=vectors, payload=list(payloads),
+                                      ids=list(ids), batch_size=len(vectors), wait=True)
+
+    @staticmethod
+    def _doc_filter(doc_ids):
+        if not doc_ids:
+            return None
+        from qdrant_client.models import Filter, FieldCondition, MatchAny
+        return Filter(must=[FieldCondition(key="doc_id", match=MatchAny(any=list(doc_ids)))])
+
+    def search(self, name, vector, limit=5, doc_ids=None):
+        # query_points replaces search, which current qdrant-client releases no longer have
+        hits = self.client.query_points(collection_name=name, query=np.asarray(vector).tolist(),
+                                        query_filter=self._doc_filter(doc_ids), limit=limit, with_payload=True,
+                                        search_params=self._search_params()).points
+        return [SearchHit(h.id, h.score, h.payload) for h in hits]
+
+    def search_batch(self, name, vectors, limit=5, doc_ids=None):
+        from qdrant_client.models import QueryRequest
+        doc_ids = doc_ids or [None] * len(vectors)
+        requests = [
+            QueryRequest(query=np.asarray(v).tolist(), filter=self._doc_filter(d), limit=limit, with_payload=True,
+                         params=self._search_params())
+            for v, d in zip(vectors, doc_ids)
+        ]
+        results = self.client.query_batch_points(collection_name=name, requests=requests)
+        return [[SearchHit(h.id, h.score, h.payload) for h in result.points] for result in results]
+
+
+# ------------------------------------------------------------
+# LOCAL (IN-PROCESS)
+# ------------------------------------------------------------
+class _QuantizedCodes:
+    """
+    In-memory compact copy of a collection's vectors for the first search pass.
+
+    int8: each row scaled by its own max |value| into int8 codes (plus one
+    float32 scale per row). binary: one sign bit per dimension, scored as
+    the float query against +/-1 per bit. Codes are persisted next to vectors.f32 and rebuilt
+    from it when missing or stale.
+    """
+
+    def __init__(self, path: str, mode: str, dim: int):
+        if mode not in DEFAULT_OVERSAMPLE:
+            raise ValueError(f"Unknown VECTOR_QUANTIZATION: {mode}")
+        self.mode, self.dim = mode, dim
+        self.code_path = os.path.join(path, f"codes.{mode}")
+        self.scale_path = os.path.join(path, "codes.int8.scale")
+        self.width = dim if mode == "int8" else (dim + 7) // 8
+        self.codes = np.zeros((0, self.width), dtype=np.int8 if mode == "int8" else np.uint8)
+        self.scales = np.zeros(0, dtype=np.float32)
+
+    def encode(self, vectors: np.ndarray):
+        if self.mode == "binary":
+            return np.packbits(vectors > 0, axis=1), None
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+    def sync(self, count: int, matrix):
+        """Loads persisted codes, truncated to `count` rows, and encodes any rows they lack."""
+        if os.path.exists(self.code_path):
+            codes = np.fromfile(self.code_path, dtype=self.codes.dtype)
+            self.codes = codes[:codes.size // self.width * self.width].reshape(-1, self.width)[:count]
+            if self.mode == "int8":
+                self.scales = np.fromfile(self.scale_path, dtype=np.float32)[:len(self.codes)]
+                self.codes = self.codes[:len(self.scales)]
+            self._save()
+        for start in range(len(self.codes), count, QUANT_BLOCK_ROWS):
+            self.append(np.asarray(matrix()[start:min(start + QUANT_BLOCK_ROWS, count)]))
+
+    def _save(self):
+        self.codes.tofile(self.code_path)
+        if self.mode == "int8":
+            self.scales.tofile(self.scale_path)
+
+    def append(self, vectors: np.ndarray):
+        codes, scales = self.encode(vectors)
+        with open(self.code_path, "ab") as f:
+            f.write(codes.tobytes())
+        self.codes = np.concatenate([self.codes, codes])
+        if scales is not None:
+            with open(self.scale_path, "ab") as f:
+                f.write(scales.tobytes())
+            self.scales = np.concatenate([self.scales, scales])
+
+    def update(self, rows: List[int], vectors: np.ndarray):
+        codes, scales = self.encode(vectors)
+        self.codes[rows] = codes
+        if scales is not None:
+            self.scales[rows] = scales
+        self._save()
+
+    def scores(self, queries: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Approximate (n_queries, n_rows) similarities, computed block by block."""
+        n = len(self.codes) if rows is None else rows.size
+        out = np.empty((len(queries), n), dtype=np.float32)
+        for start in range(0, n, QUANT_BLOCK_ROWS):
+            sel = slice(start, min(start + QUANT_BLOCK_ROWS, n))
+            idx = sel if rows is None else rows[sel]
+            if self.mode == "int8":
+                out[:, sel] = (queries @ self.codes[idx].astype(np.float32).T) * self.scales[idx]
+            else:
+                # Asymmetric: the float query against +/-1 codes, more accurate than Hamming
+                signs = np.unpackbits(self.codes[idx], axis=1, count=self.dim).astype(np.float32) * 2.0 - 1.0
+                out[:, sel] = queries @ signs.T
+        return out
+
+    def nbytes(self) -> int:
+        return int(self.codes.nbytes + self.scales.nbytes)
+
+
+def _top_rows(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k best scores per row of `scores`, best first."""
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1)
+    return np.take_along_axis(top, order, axis=1)
+
+
+class _LocalCollection:
+    """
+    One collection on disk: a contiguous float32 matrix (vectors.f32, rows
+    L2-normalised so dot product is cosine), an append-only points.jsonl of
+    [id, payload] rows and meta.json. The matrix is memory-mapped for search.
+
+    With quantization, exact scans run over in-memory int8/binary codes and
+    only an oversampled candidate set is rescored from the memory-mapped
+    float32 rows. (The optional HNSW graph keeps its own float copy.)
+    """
+
+    def __init__(self, path: str, dim: Optional[int] = None, quantization: str = VECTOR_QUANTIZATION):
+        self.path = path
+        self.lock = threading.RLock()
+        meta_path = os.path.join(path, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            self.dim, self.count = meta["dim"], meta["count"]
+            self.ids, self.payloads = [], []
+            # Drop rows written after the last meta update (interrupted upsert) from
+            # both files, so the next append lines up with the vectors again
+            with open(os.path.join(path, "points.jsonl"), "r+b") as f:
+                for _ in range(self.count):
+                    pid, payload = json.loads(f.readline())
+                    self.ids.append(pid)
+                    self.payloads.append(payload)
+                f.truncate(f.tell())
+            with open(os.path.join(path, "vectors.f32"), "r+b") as f:
+                f.truncate(self.count * self.dim * 4)
+        else:
+            os.makedirs(path, exist_ok=True)
+            self.dim, self.count, self.ids, self.payloads = dim, 0, [], []
+            open(os.path.join(path, "vectors.f32"), "wb").close()
+            open(os.path.join(path, "points.jsonl"), "w").close()
+            self._save_meta()
+        self.rows = {pid: row for row, pid in enumerate(self.ids)}
+        self.doc_rows = {}
+        for row, payload in enumerate(self.payloads):
+            self._index_payload(row, payload)
+        self._matrix = None
+        self._hnsw = None
+        self.quant = None
+        if quantization != "none":
+            self.quant = _QuantizedCodes(path, quantization, self.dim)
+            self.quant.sync(self.count, self.matrix)
+            self.oversample = QUANT_OVERSAMPLE or DEFAULT_OVERSAMPLE[quantization]
+
+    def _index_payload(self, row: int, payload: Dict[str, Any], old: Optional[Dict[str, Any]] = None):
+        # doc_id -> rows, the local equivalent of a keyword payload index
+        if old is not None and old.get("doc_id") in self.doc_rows:
+            self.doc_rows[old["doc_id"]].discard(row)
+        if payload.get("doc_id") is not None:
+            self.doc_rows.setdefault(payload["doc_id"], set()).add(row)
+
+    def _save_meta(self):
+        with open(os.path.join(self.path, "meta.json"), "w") as f:
+            json.dump({"dim": self.dim, "count": self.count}, f)
+
+    def _rewrite_points(self):
+        with open(os.path.join(self.path, "points.jsonl"), "w", encoding="utf-8") as f:
+            for pid, payload in zip(self.ids, self.payloads):
+                f.write(json.dumps([pid, payload]) + "\n")
+
+    def matrix(self) -> np.ndarray:
+        if self._matrix is None:
+            if self.count == 0:
+                return np.zeros((0, self.dim), dtype=np.float32)
+            self._matrix = np.memmap(os.path.join(self.path, "vectors.f32"), dtype=np.float32,
+                                     mode="r+", shape=(self.count, self.dim))
+        return self._matrix
+
+    def upsert(self, ids, vectors, payloads):
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms > 0, norms, 1.0)
+
+        with self.lock:
+            new_rows, replaced = [], []
+            for pid, vec, payload in zip(ids, vectors, payloads):
+                row = self.rows.get(pid)
+                if row is not None:
+                    self.matrix()[row] = vec
+                    self._index_payload(row, payload, self.payloads[row])
+                    self.payloads[row] = payload
+                    replaced.append((row, vec))
+                else:
+                    new_rows.append((pid, vec, payload))
+
+            if new_rows:
+                with open(os.path.join(self.path, "vectors.f32"), "ab") as f:
+                    f.write(np.stack([v for _, v, _ in new_rows]).tobytes())
+                with open(os.path.join(self.path, "points.jsonl"), "a", encoding="utf-8") as f:
+                    for pid, _, payload in new_rows:
+                        f.write(json.dumps([pid, payload]) + "\n")
+                if self.quant is not None:
+                    self.quant.append(np.stack([v for _, v, _ in new_rows]))
+                for pid, _, payload in new_rows:
+                    self.rows[pid] = self.count
+                    self._index_payload(self.count, payload)
+                    self.ids.append(pid)
+                    self.payloads.append(payload)
+                    self.count += 1
+                self._matrix = None
+
+            if replaced:
+                self.matrix().flush()
+                self._rewrite_points()
+                if self.quant is not None:
+                    self.quant.update([row for row, _ in replaced], np.stack([v for _, v in replaced]))
+            self._save_meta()
+            if self._hnsw is not None:
+                self._hnsw_add([self.rows[pid] for pid in ids])
+
+    def delete_doc(self, doc_id: str) -> int:
+        """Drops every row of `doc_id` and compacts the files; returns the number of rows removed."""
+        with self.lock:
+            drop = self.doc_rows.get(doc_id)
+            if not drop:
+                return 0
+            keep = np.setdiff1d(np.arange(self.count), np.fromiter(drop, dtype=np.int64))
+            vectors_path = os.path.join(self.path, "vectors.f32")
+            with open(vectors_path + ".tmp", "wb") as f:
+                for start in range(0, keep.size, QUANT_BLOCK_ROWS):
+                    f.write(np.asarray(self.matrix()[keep[start:start + QUANT_BLOCK_ROWS]]).tobytes())
+            self._matrix = None
+            os.replace(vectors_path + ".tmp", vectors_path)
+
+            self.ids = [self.ids[r] for r in keep]
+            self.payloads = [self.payloads[r] for r in keep]
+            self.count = int(keep.size)
+            self._rewrite_points()
+            self._save_meta()
+            self.rows = {pid: row for row, pid in enumerate(self.ids)}
+            self.doc_rows = {}
+            for row, payload in enumerate(self.payloads):
+                self._index_payload(row, payload)
+
+            if self.quant is not None:
+                self.quant.codes = self.quant.codes[keep]
+                if self.quant.mode == "int8":
+                    self.quant.scales = self.quant.scales[keep]
+                self.quant._save()
+            # Row numbers shifted, so the HNSW graph is rebuilt on next use
+            self._hnsw = None
+            if os.path.exists(self._hnsw_path()):
+                os.remove(self._hnsw_path())
+            return len(drop)
+
+    # -- HNSW ----------------------------------------------------------
+    def _hnsw_path(self) -> str:
+        return os.path.join(self.path, "index.hnsw")
+
+    def _hnsw_add(self, rows: List[int]):
+        index = self._hnsw
+        if self.count > index.get_max_elements():
+            index.resize_index(max(self.count, index.get_max_elements() * 2))
+        index.add_items(np.asarray(self.matrix()[rows]), np.asarray(rows))
+        index.save_index(self._hnsw_path())
+
+    def hnsw(self):
+        """Loads or builds the HNSW graph once the collection is large enough."""
+        if not HNSW_AVAILABLE or LOCAL_HNSW_MIN <= 0 or self.count < LOCAL_HNSW_MIN:
+            return None
+        if self._hnsw is None:
+            index = hnswlib.Index(space="ip", dim=self.dim)
+            indexed = 0
+            if os.path.exists(self._hnsw_path()):
+                index.load_index(self._hnsw_path(), max_elements=self.count)
+                indexed = index.get_current_count()
+            else:
+                index.init_index(max_elements=self.count, ef_construction=HNSW_EF_CONSTRUCTION, M=HNSW_M)
+            index.set_ef(HNSW_EF)
+            self._hnsw = index
+            if indexed < self.count:
+                self._hnsw_add(list(range(indexed, self.count)))
+        return self._hnsw
+
+    # -- search ----------------------------------------------------------
+    @staticmethod
+    def _normalize(vectors) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(vectors), -1)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms > 0, norms, 1.0)
+
+    def _exact_scores(self, queries: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Full-precision (n_queries, n_rows) similarities over all rows or a
+        subset, reading the memory-mapped matrix one block at a time instead
+        of copying the selected rows out in one piece.
+        """
+        matrix = self.matrix()
+        n = self.count if rows is None else rows.size
+        out = np.empty((len(queries), n), dtype=np.float32)
+        for start in range(0, n, QUANT_BLOCK_ROWS):
+            sel = slice(start, min(start + QUANT_BLOCK_ROWS, n))
+            block = matrix[sel] if rows is None else matrix[rows[sel]]
+            out[:, sel] = queries @ np.asarray(block).T
+        return out
+
+    def _rank(self, queries: np.ndarray, limit: int, rows: Optional[np.ndarray] = None):
+        """
+        Exact top-`limit` (rows, scores) per query over all rows or the given
+        subset. With quantization the scan runs over the codes and only
+        `oversample * limit` candidates are rescored in full precision.
+        """
+        n = self.count if rows is None else rows.size
+        k = min(limit, n)
+        if self.quant is None or n <= k * self.oversample:
+            scores = self._exact_scores(queries, rows)
+            top = _top_rows(scores, k)
+            found = top if rows is None else rows[top]
+            return [(found[i], scores[i, top[i]]) for i in range(len(queries))]
+
+        approx = self.quant.scores(queries, rows)
+        candidates = _top_rows(approx, min(n, int(np.ceil(k * self.oversample))))
+        results = []
+        for query, cand in zip(queries, candidates):
+            cand = np.sort(cand if rows is None else rows[cand])
+            exact = np.asarray(self.matrix()[cand]) @ query
+            best = np.argsort(-exact)[:k]
+            results.append((cand[best], exact[best]))
+        return results
+
+    def _hits(self, rows, scores) -> List[SearchHit]:
+        return [SearchHit(self.ids[r], float(s), self.payloads[r]) for r, s in zip(rows, scores)]
+
+    def _snapshot(self) -> "_LocalCollection":
+        """
+        A view of the current rows for scoring outside the lock. Upserts only
+        append rows or rebind arrays, so the rows it sees stay valid.
+        """
+        snap = copy.copy(self)
+        snap._matrix = self.matrix()
+        if self.quant is not None:
+            snap.quant = copy.copy(self.quant)
+        return snap
+
+    def search(self, vector, limit, doc_ids=None):
+        query = self._normalize([vector])
+        subset = None
+
+        with self.lock:
+            if self.count == 0:
+                return []
+            if doc_ids:
+                # Filtered: exact search over the matching rows only
+                subset = np.fromiter(sorted(set().union(*(self.doc_rows.get(d, ()) for d in doc_ids))), dtype=np.int64)
+                if subset.size == 0:
+                    return []
+            else:
+                index = self.hnsw()
+                if index is not None:
+                    labels, distances = index.knn_query(query[0], k=min(limit, self.count))
+                    return self._hits(labels[0], 1.0 - distances[0])
+            snap = self._snapshot()
+        # Score without the lock, so searches run in parallel and don't wait on upserts
+        return snap._hits(*snap._rank(query, limit, subset)[0])
+
+    def search_batch(self, vectors, limit, doc_ids=None):
+        """Unfiltered exact queries share one scan; the rest go through search()."""
+        doc_ids = doc_ids or [None] * len(vectors)
+        results = [None] * len(vectors)
+        plain = [i for i, d in enumerate(doc_ids) if not d]
+
+        snap = None
+        with self.lock:
+            if plain and self.count and self.hnsw() is None:
+                snap = self._snapshot()
+        if snap is not None:
+            ranked = snap._rank(self._normalize([vectors[i] for i in plain]), limit)
+            for i, (rows, scores) in zip(plain, ranked):
+                results[i] = snap._hits(rows, scores)
+
+        for i, (vec, d) in enumerate(zip(vectors, doc_ids)):
+            if results[i] is None:
+                results[i] = self.search(vec, limit, d)
+        return results
+
+    def memory_stats(self) -> Dict[str, Any]:
+        full = self.count * self.dim * 4
+        index = self.quant.nbytes() if self.quant is not None else full
+        return {"vectors": self.count, "full_precision_bytes": full, "first_pass_bytes": index,
+                "compression": round(full / index, 2) if index else 1.0}
+
+
+class LocalVectorStore(VectorStore):
+    """
+    In-process exact search over memory-mapped matrices, with an optional
+    HNSW graph for large collections. Persists under `root` and reloads
+    lazily on first access.
+    """
+
+    def __init__(self, root: str = LOCAL_INDEX_DIR, quantization: str = VECTOR_QUANTIZATION):
+        self.root = root
+        self.quantization = quantization
+        self._collections = {}
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    def _get(self, name: str) -> _LocalCollection:
+        with self._lock:
+            coll = self._collections.get(name)
+            if coll is None:
+                if not os.path.exists(os.path.join(self._path(name), "meta.json")):
+                    raise KeyError(f"Collection {name} not found")
+                coll = self._collections[name] = _LocalCollection(self._path(name), quantization=self.quantization)
+            return coll
+
+    def collection_exists(self, name):
+        return name in self._collections or os.path.exists(os.path.join(self._path(name), "meta.json"))
+
+    def create_collection(self, name, dim):
+        with self._lock:
+            self._collections[name] = _LocalCollection(self._path(name), dim, self.quantization)
+
+    def delete_collection(self, name):
+        with self._lock:
+            self._collections.pop(name, None)
+            shutil.rmtree(self._path(name), ignore_errors=True)
+
+    def delete_document(self, name, doc_id):
+        if self.collection_exists(name):
+            self._get(name).delete_doc(doc_id)
+
+    def create_payload_index(self, name, field):
+        # doc_id rows are always indexed in memory; nothing to build
+        if field != "doc_id":
+            raise ValueError("Local store only indexes the doc_id payload field")
+
+    def upsert(self, name, ids, vectors, payloads):
+        self._get(name).upsert(ids, vectors, payloads)
+
+    def search(self, name, vector, limit=5, doc_ids=None):
+        return self._get(name).search(vector, limit, doc_ids)
+
+    def search_batch(self, name, vectors, limit=5, doc_ids=None):
+        return self._get(name).search_batch(vectors, limit, doc_ids)
+
+    def memory_stats(self, name: str) -> Dict[str, Any]:
+        return self._get(name).memory_stats()
+
+
+def create_vector_store(backend: str = VECTOR_BACKEND, **kwargs) -> VectorStore:
+    """Builds the configured backend ("qdrant" or "local")."""
+    if backend == "local":
+        return LocalVectorStore(kwargs.get("root", LOCAL_INDEX_DIR))
+    if backend == "qdrant":
+        if not kwargs.get("url"):
+            raise ValueError("QDRANT_URL and QDRANT_API must be set.")
+        return QdrantVectorStore(kwargs["url"], kwargs.get("api_key"))
+    raise ValueError(f"Unknown VECTOR_BACKEND: {backend}")
+
+
+# ------------------------------------------------------------
+# BENCHMARK
+# ------------------------------------------------------------
+def benchmark_quantization(n: int = 50000, dim: int = 384, n_queries: int = 200, limit: int = 5,
+                           modes=("int8", "binary"), tolerance: float = 0.02):
+    """
+    Recall@limit and first-pass memory of each quantization mode against
+    exact float32 search, on clustered synthetic embeddings. A mode passes
+    when its recall is within `tolerance` of exact search (1.0).
+    """
+    import tempfile
+    import time
+    global LOCAL_HNSW_MIN
+
+    rng = np.random.RandomState(0)
+    centers = rng.normal(size=(max(1, n // 200), dim))
+    data = centers[rng.randint(len(centers), size=n)] + 0.6 * rng.normal(size=(n, dim))
+    queries = centers[rng.randint(len(centers), size=n_queries)] + 0.6 * rng.normal(size=(n_queries, dim))
+
+    results, hnsw_min = {}, LOCAL_HNSW_MIN
+    LOCAL_HNSW_MIN = 0  # compare exact scans, not the HNSW graph
+    with tempfile.TemporaryDirectory() as root:
+        exact_store = LocalVectorStore(os.path.join(root, "none"), quantization="none")
+        exact_store.create_collection("bench", dim)
+        exact_store.upsert("bench", list(range(n)), data, [{} for _ in range(n)])
+        truth = [{h.id for h in hits} for hits in exact_store.search_batch("bench", queries, limit)]
+
+        for mode in modes:
+            store = LocalVectorStore(os.path.join(root, mode), quantization=mode)
+            store.create_collection("bench", dim)
+            store.upsert("bench", list(range(n)), data, [{} for _ in range(n)])
+            start = time.perf_counter()
+            found = store.search_batch("bench", queries, limit)
+            elapsed = time.perf_counter() - start
+            recall = float(np.mean([len(t & {h.id for h in hits}) / limit for t, hits in zip(truth, found)]))
+            results[mode] = {**store.memory_stats("bench"), f"recall@{limit}": round(recall, 4),
+                             "queries_per_s": round(n_queries / elapsed, 1), "pass": recall >= 1.0 - tolerance}
+    LOCAL_HNSW_MIN = hnsw_min
+    return results
+
+
+if __name__ == "__main__":
+    for mode, row in benchmark_quantization().items():
+        print(f"{mode:7s} {row}")
@@ -261,7 +261,7 @@
 
 // export default App;
 
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 import { FileText, AlertCircle, CheckCircle, ArrowLeft } from 'lucide-react';
 import { PDFUpload } from './components/PDFUpload';
 import { PDFViewer } from './components/PDFViewer';
@@ -282,6 +282,10 @@ export function App() {
   const [isUploading, setIsUploading] = useState(false);
   const [isQuerying, setIsQuerying] = useState(false);
   const [backendStatus, setBackendStatus] = useState<'checking' | 'online' | 'offline'>('checking');
+  const streamRef = useRef<AbortController | null>(null);
+
+  // Closing the page or app stops any answer still streaming
+  useEffect(() => () => streamRef.current?.abort(), []);
 
   useEffect(() => {
     if (showApp) checkBackendHealth();
@@ -326,25 +330,42 @@ export function App() {
     setMessages((prev) => [...prev, userMessage]);
     setIsQuerying(true);
 
+    // Stream the answer into one assistant message as tokens arrive
+    streamRef.current?.abort();
+    const controller = new AbortController();
+    streamRef.current = controller;
+    const assistantId = (Date.now() + 1).toString();
+    const updateAssistant = (update: (message: Message) => Message) =>
+      setMessages((prev) => prev.map((m) => (m.id === assistantId ? update(m) : m)));
+
     try {
-      const response = await api.query(selectedDoc.doc_id, query);
-      const assistantMessage: Message = {
-        id: (Date.now() + 1).toString(),
-        role: 'assistant',
-        content: response.answer,
-        timestamp: new Date(),
-        context: response.context,
-      };
-      setMessages((prev) => [...prev, assistantMessage]);
+      await api.queryStream(
+        selectedDoc.doc_id,
+        query,
+        {
+          onContext: (context) =>
+            setMessages((prev) => [
+              ...prev,
+              { id: assistantId, role: 'assistant', content: '', timestamp: new Date(), context },
+            ]),
+          onToken: (text) => updateAssistant((m) => ({ ...m, content: m.content + text })),
+          onDone: (answer) => updateAssistant((m) => ({ ...m, content: answer })),
+        },
+        controller.signal,
+      );
     } catch (error) {
+      if (controller.signal.aborted) return;
       const errorMsg = error instanceof APIError ? error.message : 'Failed to process query.';
       addToast('error', errorMsg);
       setMessages((prev) => [
-        ...prev,
-        { id: (Date.now() + 1).toString(), role: 'assistant', content: 'Error processing question.', timestamp: new Date() },
+        ...prev.filter((m) => m.id !== assistantId),
+        { id: assistantId, role: 'assistant', content: 'Error processing question.', timestamp: new Date() },
       ]);
     } finally {
-      setIsQuerying(false);
+      if (streamRef.current === controller) {
+        streamRef.current = null;
+        setIsQuerying(false);
+      }
     }
   };
 
@@ -455,7 +476,7 @@ export function App() {
               {documents.map((doc) => (
                 <button
                   key={doc.doc_id}
-                  onClick={() => { setSelectedDoc(doc); setMessages([]); }}
+                  onClick={() => { streamRef.current?.abort(); setSelectedDoc(doc); setMessages([]); }}
                   className={`px-3 py-2 rounded-lg text-sm font-medium transition-all duration-300 shadow-neon-light ${
                     selectedDoc.doc_id === doc.doc_id
                       ? 'bg-neon-green text-black shadow-lg'
@@ -325,8 +325,8 @@ export function ChatInterface({
               <MessageBubble key={message.id} message={message} />
             ))}
 
-            {/* Loading/Typing Indicator */}
-            {isLoading && (
+            {/* Loading/Typing Indicator, until the streamed answer starts */}
+            {isLoading && (messages[messages.length - 1]?.role !== 'assistant' || !messages[messages.length - 1].content) && (
               <div className="flex gap-3 justify-start animate-pulse">
                 <div className="w-8 h-8 rounded-full bg-neon-green/20 border border-neon-green/50 flex items-center justify-center flex-shrink-0 mt-1 shadow-md">
                   <Bot className="w-5 h-5 text-neon-green" />
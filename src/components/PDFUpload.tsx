@@ -200,6 +200,7 @@
 
 import { useState, useRef } from 'react';
 import { Upload, FileText, Loader2, Zap } from 'lucide-react'; // Added Zap for a spark icon
+import { api } from '../utils/api';
 
 interface PDFUploadProps {
   onUploadSuccess: (docId: string, filename: string) => void;
@@ -293,6 +294,12 @@ export function PDFUpload({
       }
 
       const data = await response.json();
+
+      // Ingestion runs in the background; poll the job until it finishes
+      await api.waitForJob(data.job_id, (job) => {
+        const done = job.stages.filter((s) => s.status === 'done').length;
+        setUploadProgress(Math.min(95, 90 + done));
+      });
       setUploadProgress(100);
 
       setTimeout(() => {
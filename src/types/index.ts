@@ -16,6 +16,24 @@ export interface UploadResponse {
   status: string;
   message: string;
   doc_id: string;
+  job_id: string;
+}
+
+export interface JobStage {
+  name: string;
+  status: 'running' | 'done' | 'failed';
+  progress: { done: number; total: number | null } | null;
+  ms: number | null;
+}
+
+export interface JobStatus {
+  job_id: string;
+  status: 'queued' | 'running' | 'done' | 'failed';
+  doc_id: string;
+  filename: string;
+  stages: JobStage[];
+  elapsed_ms: number;
+  error: string | null;
 }
 
 export interface QueryResponse {
@@ -23,6 +41,12 @@ export interface QueryResponse {
   context: Array<{ page: number; text: string }>;
 }
 
+export interface QueryStreamHandlers {
+  onContext?: (context: QueryResponse['context']) => void;
+  onToken?: (text: string) => void;
+  onDone?: (answer: string) => void;
+}
+
 export interface HealthResponse {
   status: string;
   backend: string;
@@ -1,4 +1,4 @@
-import type { UploadResponse, QueryResponse, HealthResponse } from '../types';
+import type { UploadResponse, QueryResponse, QueryStreamHandlers, HealthResponse, JobStatus } from '../types';
 
 const API_BASE_URL = 'http://localhost:8000';
 
@@ -36,6 +36,30 @@ export const api = {
     return response.json();
   },
 
+  async getJob(job_id: string): Promise<JobStatus> {
+    const response = await fetch(`${API_BASE_URL}/jobs/${job_id}`);
+    if (!response.ok) {
+      throw new APIError(response.status, 'Failed to fetch job status');
+    }
+    return response.json();
+  },
+
+  async waitForJob(
+    job_id: string,
+    onUpdate?: (job: JobStatus) => void,
+    intervalMs = 1500,
+  ): Promise<JobStatus> {
+    for (;;) {
+      const job = await this.getJob(job_id);
+      onUpdate?.(job);
+      if (job.status === 'done') return job;
+      if (job.status === 'failed') {
+        throw new APIError(500, job.error || 'Processing failed');
+      }
+      await new Promise((resolve) => setTimeout(resolve, intervalMs));
+    }
+  },
+
   async query(doc_id: string, query: string): Promise<QueryResponse> {
     const response = await fetch(`${API_BASE_URL}/query`, {
       method: 'POST',
@@ -53,6 +77,69 @@ export const api = {
     return response.json();
   },
 
+  // Streams an answer over Server-Sent Events; aborting `signal` stops generation server-side.
+  async queryStream(
+    doc_id: string,
+    query: string,
+    handlers: QueryStreamHandlers,
+    signal?: AbortSignal,
+  ): Promise<QueryResponse> {
+    const response = await fetch(`${API_BASE_URL}/query_stream`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        Accept: 'text/event-stream',
+      },
+      body: JSON.stringify({ doc_id, query }),
+      signal,
+    });
+
+    if (!response.ok || !response.body) {
+      const error = await response.json().catch(() => ({ message: 'Query failed' }));
+      throw new APIError(response.status, error.detail || error.message || 'Failed to process query');
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    const result: QueryResponse = { answer: '', context: [] };
+    let buffer = '';
+
+    for (;;) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      let boundary: number;
+      while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+        const raw = buffer.slice(0, boundary);
+        buffer = buffer.slice(boundary + 2);
+
+        let event = 'message';
+        let data = '';
+        for (const line of raw.split('\n')) {
+          if (line.startsWith('event:')) event = line.slice(6).trim();
+          else if (line.startsWith('data:')) data += line.slice(5).trim();
+        }
+        const payload = data ? JSON.parse(data) : null;
+
+        if (event === 'context') {
+          result.context = payload;
+          handlers.onContext?.(payload);
+        } else if (event === 'token') {
+          result.answer += payload.text;
+          handlers.onToken?.(payload.text);
+        } else if (event === 'done') {
+          result.answer = payload.answer;
+          handlers.onDone?.(payload.answer);
+        } else if (event === 'error') {
+          throw new APIError(500, payload?.detail || 'Failed to process query');
+        }
+      }
+    }
+
+    return result;
+  },
+
   async listDocuments(): Promise<Array<{ doc_id: string; filename: string }>> {
     const response = await fetch(`${API_BASE_URL}/documents`);
     if (!response.ok) {